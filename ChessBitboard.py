@@ -0,0 +1,76 @@
+"""
+Bitboard representation of the chess board.
+Every piece type of every color is kept as one 64-bit integer where bit (row * 8 + col) is set when that
+piece stands on the square (row, col). Row 0 is the 8th rank (black's back rank) just like GameState.board.
+Occupancy sets for each color and for the whole board are kept alongside so move generation can work
+with whole sets of squares at once instead of walking the board square by square.
+"""
+
+FULL = (1 << 64) - 1 #all 64 squares
+
+PIECES = ("wp", "wR", "wN", "wB", "wQ", "wK", "bp", "bR", "bN", "bB", "bQ", "bK")
+PIECE_TYPES = ("p", "R", "N", "B", "Q", "K")
+
+"""
+Yields the square index of every set bit, lowest first
+"""
+def squares(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+"""
+Takes an 8x8 list of 2-character piece strings (the same format GameState used to keep) and builds the bitboards.
+Indexing a BitBoard with a row still gives back a list of piece strings, so board[row][col] works for drawing
+and for the Move constructor. The rows are a read-only view: changes must go through addPiece, removePiece and movePiece
+so that the bitboards and the view never disagree.
+"""
+class BitBoard():
+    def __init__(self, board):
+        self.pieces = {piece: 0 for piece in PIECES} #one 64-bit set per piece type and color
+        self.occupancy = {"w": 0, "b": 0} #all the squares occupied by each color
+        self.occupied = 0 #all the occupied squares
+        self.rows = [["--"] * 8 for _ in range(8)]
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] != "--":
+                    self.addPiece(row * 8 + col, board[row][col])
+
+    def __getitem__(self, row):
+        return self.rows[row]
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def pieceAt(self, sq):
+        return self.rows[sq >> 3][sq & 7]
+
+    def addPiece(self, sq, piece):
+        bit = 1 << sq
+        self.pieces[piece] |= bit
+        self.occupancy[piece[0]] |= bit
+        self.occupied |= bit
+        self.rows[sq >> 3][sq & 7] = piece
+
+    def removePiece(self, sq):
+        piece = self.rows[sq >> 3][sq & 7]
+        if piece != "--":
+            bit = 1 << sq
+            self.pieces[piece] ^= bit
+            self.occupancy[piece[0]] ^= bit
+            self.occupied ^= bit
+            self.rows[sq >> 3][sq & 7] = "--"
+        return piece
+
+    """
+    Moves whatever stands on startSq to endSq, removing anything that was on endSq. Returns the removed piece or "--".
+    """
+    def movePiece(self, startSq, endSq):
+        captured = self.removePiece(endSq)
+        self.addPiece(endSq, self.removePiece(startSq))
+        return captured
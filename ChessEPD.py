@@ -0,0 +1,93 @@
+"""
+Streaming reader for files of positions, one FEN or EPD record per line.
+Positions are read and built one line at a time, so a file of millions of positions never has to fit in memory.
+Large files can be memory-mapped instead of read through a file buffer.
+
+An EPD record is the first 4 FEN fields followed by operations, for example
+    rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - bm e4; id "start";
+"""
+
+import gzip
+import mmap
+import os
+import sys
+import time
+
+import ChessEngine
+
+"""
+Splits an EPD operation string into a dictionary of opcode: operand. Semicolons inside quotes do not end an operation.
+"""
+def parseOperations(text):
+    operations = {}
+    operation = ""
+    quoted = False
+    for char in text + ";":
+        if char == '"':
+            quoted = not quoted
+        if char == ";" and not quoted:
+            operation = operation.strip()
+            if operation:
+                parts = operation.split(None, 1)
+                operations[parts[0]] = parts[1].strip().strip('"') if len(parts) > 1 else ""
+            operation = ""
+        else:
+            operation += char
+    return operations
+
+"""
+Splits one line into its FEN and its EPD operations (empty for a plain FEN line).
+The clocks of an EPD record come from its hmvc and fmvn operations when it has them.
+"""
+def parseLine(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("a position needs at least 4 fields: %r" % line)
+    rest = fields[4] if len(fields) > 4 else ""
+    clocks = rest.split()
+    if len(clocks) == 2 and clocks[0].isdigit() and clocks[1].isdigit(): #a full FEN
+        return " ".join(fields[:4] + clocks), {}
+    operations = parseOperations(rest)
+    fen = " ".join(fields[:4] + [operations.get("hmvc", "0"), operations.get("fmvn", "1")])
+    return fen, operations
+
+"""
+The lines of a file one at a time as text, read normally or through a memory map.
+Files ending in .gz are decompressed on the fly. Bytes that are not UTF-8 are replaced, not an error.
+"""
+def readLines(path, useMmap=False):
+    with open(path, "rb") as f:
+        mapped = None
+        source = f
+        if useMmap and os.fstat(f.fileno()).st_size > 0: #an empty file can not be mapped
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            source = mapped
+        try:
+            if path.endswith(".gz"):
+                source = gzip.GzipFile(fileobj=source)
+            for line in iter(source.readline, b""): #files, memory maps and gzip files all read line by line
+                yield line.decode("utf-8", errors="replace")
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+"""
+Yields (GameState, operations) for every position in a FEN or EPD file. Blank lines and lines starting with # are skipped.
+"""
+def readPositions(path, useMmap=False):
+    for line in readLines(path, useMmap):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fen, operations = parseLine(line)
+        yield ChessEngine.GameState(fen), operations
+
+
+if __name__ == "__main__":
+    #python ChessEPD.py positions.epd [--mmap]: reads every position of the file and reports positions per second
+    start = time.perf_counter()
+    count = 0
+    for gs, operations in readPositions(sys.argv[1], "--mmap" in sys.argv[2:]):
+        count += 1
+    seconds = time.perf_counter() - start
+    print("%d positions in %.3f s (%.0f positions/s)" % (count, seconds, count / seconds if seconds > 0 else 0.0))
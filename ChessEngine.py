@@ -4,38 +4,279 @@ It will also be responsible for determining the valid moves at the current state
 It will also keep a move log.
 """
 
+import ChessBitboard
+import ChessEval
+import ChessTables
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+#when True, makeMove and undoMove check the Zobrist key and the evaluation totals against a full recompute after every move
+DEBUG = False
+
+#castling rights are kept as bits of one number
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_LETTERS = (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+
+#FEN letters of the pieces, upper case for white and lower case for black
+FEN_PIECES = {"P": "wp", "R": "wR", "N": "wN", "B": "wB", "Q": "wQ", "K": "wK",
+              "p": "bp", "r": "bR", "n": "bN", "b": "bB", "q": "bQ", "k": "bK"}
+PIECES_FEN = {v: k for k, v in FEN_PIECES.items()}
+
+PROMOTION_PIECES = ("Q", "R", "B", "N")
+
+"""
+The castling rights that are kept when a piece moves from or to each square: moving the king or a rook,
+or capturing a rook on its starting square, gives up the rights that depend on it
+"""
+def buildCastlingMasks():
+    masks = [WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE] * 64
+    for sq, lost in ((0, BLACK_QUEENSIDE), (7, BLACK_KINGSIDE), (4, BLACK_KINGSIDE | BLACK_QUEENSIDE),
+                     (56, WHITE_QUEENSIDE), (63, WHITE_KINGSIDE), (60, WHITE_KINGSIDE | WHITE_QUEENSIDE)):
+        masks[sq] &= ~lost
+    return masks
+
+CASTLING_MASKS = buildCastlingMasks()
+
+#the king and rook squares each castling right needs
+CASTLING_SQUARES = ((WHITE_KINGSIDE, "w", 60, 63), (WHITE_QUEENSIDE, "w", 60, 56),
+                    (BLACK_KINGSIDE, "b", 4, 7), (BLACK_QUEENSIDE, "b", 4, 0))
+
+#piece values for the static exchange evaluation, the king is worth more than everything else together
+SEE_VALUE = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 20000}
+SEE_ORDER = ("p", "N", "B", "R", "Q", "K") #least valuable first
+
+#for each attacking color: its pawn, knight, bishop, rook, queen and king, and the table that finds its pawns from the attacked square
+ATTACKERS = {"w": ("wp", "wN", "wB", "wR", "wQ", "wK", ChessTables.PAWN_ATTACKS["b"]),
+             "b": ("bp", "bN", "bB", "bR", "bQ", "bK", ChessTables.PAWN_ATTACKS["w"])}
+
 class GameState():
-    def __init__(self):
+    """
+    Starts from the usual starting position, or from the position of a FEN string when one is given
+    """
+    def __init__(self, fen=None):
         #board is an BxB 2d list, each element of the list has 2 characters.
         #The first character represents the color of the piece, 'b' or 'w'
         #The second character represe4ntys the type of the piece, 'K', 'Q'....
         #"--" represents an empty space with no piece.
-        self.board = [
+        #The list is only used to set up the position: the board is kept as bitboards (see ChessBitboard),
+        #and board[row][col] still gives back the 2 character strings.
+        self.board = ChessBitboard.BitBoard([
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "wR", "--", "--", "bB", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
-            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
+            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]])
         self.moveFunctions = {"p": self.getPawnMoves, "R": self.getRookMoves, "N": self.getKnightMoves,
         "B": self.getBishopMoves, "Q": self.getQueenMoves, "K": self.getKingMoves}
         self.whiteToMove = True
         self.moveLog = []
         self.whiteKingLocation = (7,4)
         self.blackKingLocation = (0,4)
-        #self.checkMate = False
-        #self.staleMate = False
+        self.castlingRights = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self.enpassantPossible = () #(row, col) of the square a pawn can capture onto en passant
+        self.halfmoveClock = 0 #moves since the last capture or pawn move, for the 50-move rule
+        self.fullmoveNumber = 1
+        self.checkMate = False
+        self.staleMate = False
         self.pins = []
         self.checks = []
+        #squares the pieces of the side to move may go to while getValidMoves runs:
+        #checkMask for every piece, pinMasks replaces it for pinned pieces (and for the king, whose moves are checked separately)
+        self.checkMask = ChessBitboard.FULL
+        self.pinMasks = {}
+        self.zobristKey = self.computeZobristKey() #identifies the position, kept up to date by makeMove and undoMove
+        #evaluation totals (see ChessEval), also kept up to date by makeMove and undoMove so evaluating is only reading them
+        self.middlegameScore, self.endgameScore, self.phase = ChessEval.scoreBoard(self.board)
+        if fen is not None:
+            self.loadFEN(fen)
+
+    """
+    Computes the Zobrist key of the position from scratch
+    """
+    def computeZobristKey(self):
+        key = 0
+        for piece, bb in self.board.pieces.items():
+            for sq in ChessBitboard.squares(bb):
+                key ^= ChessTables.ZOBRIST_PIECES[piece][sq]
+        if not self.whiteToMove:
+            key ^= ChessTables.ZOBRIST_BLACK_TO_MOVE
+        key ^= ChessTables.ZOBRIST_CASTLING[self.castlingRights]
+        if self.enpassantPossible != ():
+            key ^= ChessTables.ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        return key
+
+    """
+    Sets up the position of a FEN string: piece placement, side to move, castling rights, en passant square and move clocks.
+    The clocks may be left out (as in EPD), they then start at 0 and 1. Raises ValueError for a malformed string.
+    """
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: %r" % fen)
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("FEN piece placement needs 8 rows: %r" % fen)
+        board = []
+        for fenRow in rows:
+            row = []
+            for char in fenRow:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char in FEN_PIECES:
+                    row.append(FEN_PIECES[char])
+                else:
+                    raise ValueError("unknown piece %r in FEN: %r" % (char, fen))
+            if len(row) != 8:
+                raise ValueError("FEN row %r does not have 8 squares" % fenRow)
+            board.append(row)
+        board = ChessBitboard.BitBoard(board)
+        for piece in ("wK", "bK"):
+            if board.pieces[piece].bit_count() != 1:
+                raise ValueError("FEN needs exactly one %s: %r" % (piece, fen))
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN side to move must be w or b: %r" % fen)
+        if fields[3] == "-":
+            enpassantPossible = ()
+        elif len(fields[3]) == 2 and fields[3][0] in Move.filesToCols and fields[3][1] in Move.ranksToRows:
+            enpassantPossible = (Move.ranksToRows[fields[3][1]], Move.filesToCols[fields[3][0]])
+        else:
+            raise ValueError("bad en passant square in FEN: %r" % fen)
+        if not all(field.isdigit() for field in fields[4:6]):
+            raise ValueError("FEN move clocks must be numbers: %r" % fen)
+
+        self.board = board
+        whiteKing = board.pieces["wK"].bit_length() - 1
+        blackKing = board.pieces["bK"].bit_length() - 1
+        self.whiteKingLocation = (whiteKing >> 3, whiteKing & 7)
+        self.blackKingLocation = (blackKing >> 3, blackKing & 7)
+        self.whiteToMove = fields[1] == "w"
+        #the side that just moved can not have left its king in check (this also rules out kings standing next to each other)
+        if self.isSquareAttacked(blackKing if self.whiteToMove else whiteKing, fields[1]):
+            raise ValueError("FEN has the side not to move in check: %r" % fen)
+        self.castlingRights = 0
+        for letter, right in CASTLING_LETTERS:
+            if letter in fields[2]:
+                self.castlingRights |= right
+        #a right whose king or rook is not on its starting square is dropped
+        for right, color, kingSq, rookSq in CASTLING_SQUARES:
+            if not (board.pieces[color + "K"] >> kingSq & 1 and board.pieces[color + "R"] >> rookSq & 1):
+                self.castlingRights &= ~right
+        #the en passant square is dropped unless a pawn of the side that just moved has gone past it by two squares
+        if enpassantPossible != ():
+            epRow, epCol = enpassantPossible
+            if self.whiteToMove:
+                pawn, pawnRow, fromRow, expectedRow = "bp", epRow + 1, epRow - 1, 2
+            else:
+                pawn, pawnRow, fromRow, expectedRow = "wp", epRow - 1, epRow + 1, 5
+            if epRow != expectedRow or board[pawnRow][epCol] != pawn or board[epRow][epCol] != "--" or board[fromRow][epCol] != "--":
+                enpassantPossible = ()
+        self.enpassantPossible = enpassantPossible
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+        self.zobristKey = self.computeZobristKey()
+        self.middlegameScore, self.endgameScore, self.phase = ChessEval.scoreBoard(self.board)
 
     """
-    Takes a move as a paramater and executes it (will not work for castling, en passant, and pawn promotion)
+    The FEN string of the current position
+    """
+    def getFEN(self):
+        fenRows = []
+        for row in self.board.rows:
+            fenRow = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                else:
+                    if empty:
+                        fenRow += str(empty)
+                        empty = 0
+                    fenRow += PIECES_FEN[piece]
+            if empty:
+                fenRow += str(empty)
+            fenRows.append(fenRow)
+        castling = "".join(letter for letter, right in CASTLING_LETTERS if self.castlingRights & right) or "-"
+        if self.enpassantPossible != ():
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        else:
+            enpassant = "-"
+        return "%s %s %s %s %d %d" % ("/".join(fenRows), "w" if self.whiteToMove else "b", castling, enpassant,
+            self.halfmoveClock, self.fullmoveNumber)
+
+    """
+    Takes a move as a paramater and executes it, including castling, en passant and pawn promotion
     """
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--" #because when we move a piece, when leave behind the square blank
-        self.board[move.endRow][move.endCol] = move.pieceMoved #and now it moves a piece into its end position
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        #what can not be worked out again from the move itself is kept on it, so undoMove can put it back in one step
+        move.zobristKey = self.zobristKey #the key of the position the move was made from
+        move.undoState = (self.castlingRights, self.enpassantPossible, self.halfmoveClock,
+                          self.middlegameScore, self.endgameScore, self.phase)
+        key = self.zobristKey ^ ChessTables.ZOBRIST_CASTLING[self.castlingRights] ^ ChessTables.ZOBRIST_BLACK_TO_MOVE
+        if self.enpassantPossible != ():
+            key ^= ChessTables.ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        #leave the start square blank, remove whatever was captured and put the moved piece on its end square
+        self.board.movePiece(startSq, endSq)
+        pieceKeys = ChessTables.ZOBRIST_PIECES[move.pieceMoved]
+        key ^= pieceKeys[startSq] ^ pieceKeys[endSq]
+        #the evaluation totals change by what the moved, captured, promoted and castled pieces are worth where they stand
+        middlegame = ChessEval.PIECE_SQUARE_SCORES[move.pieceMoved]
+        endgame = ChessEval.ENDGAME_PIECE_SQUARE_SCORES[move.pieceMoved]
+        middlegameScore = self.middlegameScore + middlegame[endSq] - middlegame[startSq]
+        endgameScore = self.endgameScore + endgame[endSq] - endgame[startSq]
+        if move.pieceCaptured != "--":
+            if move.isEnpassantMove: #the captured pawn is beside the start square, not on the end square
+                capturedSq = move.startRow * 8 + move.endCol
+                self.board.removePiece(capturedSq)
+            else:
+                capturedSq = endSq
+            key ^= ChessTables.ZOBRIST_PIECES[move.pieceCaptured][capturedSq]
+            middlegameScore -= ChessEval.PIECE_SQUARE_SCORES[move.pieceCaptured][capturedSq]
+            endgameScore -= ChessEval.ENDGAME_PIECE_SQUARE_SCORES[move.pieceCaptured][capturedSq]
+            self.phase -= ChessEval.PHASE_WEIGHT[move.pieceCaptured[1]]
+        if move.isPawnPromotion:
+            promotedPiece = move.pieceMoved[0] + move.promotionChoice
+            self.board.removePiece(endSq)
+            self.board.addPiece(endSq, promotedPiece)
+            key ^= pieceKeys[endSq] ^ ChessTables.ZOBRIST_PIECES[promotedPiece][endSq]
+            middlegameScore += ChessEval.PIECE_SQUARE_SCORES[promotedPiece][endSq] - middlegame[endSq]
+            endgameScore += ChessEval.ENDGAME_PIECE_SQUARE_SCORES[promotedPiece][endSq] - endgame[endSq]
+            self.phase += ChessEval.PHASE_WEIGHT[move.promotionChoice]
+        if move.isCastleMove: #the rook jumps over the king
+            rookStart, rookEnd = self.castleRookSquares(move)
+            self.board.movePiece(rookStart, rookEnd)
+            rook = move.pieceMoved[0] + "R"
+            rookKeys = ChessTables.ZOBRIST_PIECES[rook]
+            key ^= rookKeys[rookStart] ^ rookKeys[rookEnd]
+            middlegameScore += ChessEval.PIECE_SQUARE_SCORES[rook][rookEnd] - ChessEval.PIECE_SQUARE_SCORES[rook][rookStart]
+            endgameScore += ChessEval.ENDGAME_PIECE_SQUARE_SCORES[rook][rookEnd] - ChessEval.ENDGAME_PIECE_SQUARE_SCORES[rook][rookStart]
+        self.middlegameScore = middlegameScore
+        self.endgameScore = endgameScore
+        #after a two square pawn advance the square it passed over can be captured onto en passant on the next move
+        if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2:
+            self.enpassantPossible = ((move.startRow + move.endRow) // 2, move.startCol)
+            key ^= ChessTables.ZOBRIST_ENPASSANT[move.startCol]
+        else:
+            self.enpassantPossible = ()
+        self.castlingRights &= CASTLING_MASKS[startSq] & CASTLING_MASKS[endSq]
+        key ^= ChessTables.ZOBRIST_CASTLING[self.castlingRights]
+        if move.pieceMoved[1] == "p" or move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
+        self.zobristKey = key
         self.moveLog.append(move) #log the move so we can undo it later
         self.whiteToMove = not self.whiteToMove #swap players
         #update the King's location
@@ -43,9 +284,8 @@ class GameState():
             self.whiteKingLocation = (move.endRow, move.endCol)
         elif move.pieceMoved == 'bK':
             self.blackKingLocation = (move.endRow, move.endCol)
-
-
-
+        if DEBUG:
+            self.checkIncrementalState()
 
     """
     Undo the last move made
@@ -55,84 +295,231 @@ class GameState():
 # see the last move that was made and reverse it
         if len(self.moveLog) != 0:
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            startSq = move.startRow * 8 + move.startCol
+            endSq = move.endRow * 8 + move.endCol
+            self.board.movePiece(endSq, startSq)
+            if move.isPawnPromotion: #the promoted piece goes back to being a pawn
+                self.board.removePiece(startSq)
+                self.board.addPiece(startSq, move.pieceMoved)
+            if move.isEnpassantMove:
+                self.board.addPiece(move.startRow * 8 + move.endCol, move.pieceCaptured)
+            elif move.pieceCaptured != "--":
+                self.board.addPiece(endSq, move.pieceCaptured)
+            if move.isCastleMove:
+                rookStart, rookEnd = self.castleRookSquares(move)
+                self.board.movePiece(rookEnd, rookStart)
             self.whiteToMove = not self.whiteToMove
-            #update King Position if needed
+            if not self.whiteToMove:
+                self.fullmoveNumber -= 1
+            (self.castlingRights, self.enpassantPossible, self.halfmoveClock,
+             self.middlegameScore, self.endgameScore, self.phase) = move.undoState
+            self.zobristKey = move.zobristKey
+            #update King Position if needed, the king goes back to where it started
             if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.endRow, move.endCol)
+                self.whiteKingLocation = (move.startRow, move.startCol)
             elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.endRow, move.endCol)
+                self.blackKingLocation = (move.startRow, move.startCol)
+            self.checkMate = False
+            self.staleMate = False
+            if DEBUG:
+                self.checkIncrementalState()
 
+    """
+    Compares the values makeMove and undoMove keep up to date (Zobrist key, evaluation totals, king locations)
+    with the same values worked out from scratch. Raises AssertionError, with the FEN, at the first difference.
+    """
+    def checkIncrementalState(self):
+        expected = ChessEval.scoreBoard(self.board)
+        actual = (self.middlegameScore, self.endgameScore, self.phase)
+        assert actual == expected, "evaluation totals %s, recomputed %s in %s" % (actual, expected, self.getFEN())
+        assert self.zobristKey == self.computeZobristKey(), "Zobrist key differs from the recomputed one in %s" % self.getFEN()
+        whiteKing = self.board.pieces["wK"].bit_length() - 1
+        blackKing = self.board.pieces["bK"].bit_length() - 1
+        assert self.whiteKingLocation == (whiteKing >> 3, whiteKing & 7) and self.blackKingLocation == (blackKing >> 3, blackKing & 7), \
+            "king locations are off in %s" % self.getFEN()
+
+    """
+    Start and end square of the rook in a castling move
+    """
+    def castleRookSquares(self, move):
+        rowStart = move.startRow * 8
+        if move.endCol == 6: #kingside
+            return rowStart + 7, rowStart + 5
+        return rowStart, rowStart + 3 #queenside
 
     """
     All moves considering checks
     """
     def getValidMoves(self):
-        '''
-         #naive algorithm
-         #1) generate all the moves
-        moves = self.getAllPossibleMoves()
-         #2) for each move, make the move
-        for i in range(len(moves)-1, -1, -1): #when removing from a list go backwards through that list
-            self.makeMove(moves[i])            
-         #3) generate all the opponent's moves
-         #4) for each of your opponent's moves, see if they attack your king
-         #5) if they do attack your king, not a valid move
-            self.whiteToMove = not self.whiteToMove #swapping again because above makeMove function call has already swapped turns and its black's turn and inCheck will only go for Black King's location
-            if self.inCheck():
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove #swap back to make it normal
-            self.undoMove()
-        if len(moves) == 0: #no moves for the king/ no valid moves
-            if self.inCheck:
-                self.checkMate = True
-            else:
-                self.staleMate = True
+        inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.whiteToMove:
+            kingRow, kingCol = self.whiteKingLocation
         else:
-            self.inCheck = False #Because if we checkmate or stalemate and undo a move, the self.checkMate will still be true
+            kingRow, kingCol = self.blackKingLocation
+        kingSq = kingRow * 8 + kingCol
+        if inCheck:
+            if len(self.checks) == 1: #only 1 check: block the check, capture the checking piece or move the king
+                checkRow, checkCol, dRow, dCol = self.checks[0]
+                checkSq = checkRow * 8 + checkCol
+                if self.board[checkRow][checkCol][1] == 'N': #a knight can not be blocked, it has to be captured
+                    self.checkMask = 1 << checkSq
+                else: #the squares between the king and the checking piece, and the checking piece itself
+                    rays = ChessTables.RAYS[ChessTables.DIRECTIONS.index((dRow, dCol))]
+                    self.checkMask = rays[kingSq] ^ rays[checkSq]
+            else: #double check, only the king can move
+                self.checkMask = 0
+        #a pinned piece can only move along the line between the king and the pinning piece
+        self.pinMasks = {kingSq: 0} #king moves are generated below
+        for pinRow, pinCol, dRow, dCol in self.pins:
+            pinRay = ChessTables.RAYS[ChessTables.DIRECTIONS.index((dRow, dCol))][kingSq]
+            self.pinMasks[pinRow * 8 + pinCol] = pinRay & self.checkMask
+        moves = self.getAllPossibleMoves()
+        self.getSafeKingMoves(kingRow, kingCol, moves)
+        if not inCheck: #can not castle out of check
+            self.getCastleMoves(kingRow, kingCol, moves)
+        self.checkMask = ChessBitboard.FULL
+        self.pinMasks = {}
+        if len(moves) == 0: #no valid moves
+            self.checkMate = inCheck
+            self.staleMate = not inCheck
+        else: #because if we checkmate or stalemate and undo a move, they would still be true
+            self.checkMate = False
             self.staleMate = False
         return moves
-        '''
-        #advanced algorithm
-        moves = []
-    
+
     """
     Determine if the current player is under attack
     """
     def inCheck(self):
         if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
+            return self.isSquareAttacked(self.whiteKingLocation[0] * 8 + self.whiteKingLocation[1], "b")
         else:
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
-            
+            return self.isSquareAttacked(self.blackKingLocation[0] * 8 + self.blackKingLocation[1], "w")
+
     """
     Determine if the enemy can attack the square (row,col)
     """
     def squareUnderAttack(self, row, col):
-        self.whiteToMove = not self.whiteToMove #switch to opponent's POV
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove #switch turns back
-        for move in oppMoves:
-            if move.endRow == row and move.endCol == col: #This means that this square (row, col) is under attack
-                self.whiteToMove = not self.whiteToMove #switch turns back, otherwise this function will modify the turn order
-                return True
-        return False
-         
+        return self.isSquareAttacked(row * 8 + col, "b" if self.whiteToMove else "w")
+
+    """
+    True if a piece of byColor ('w' or 'b') attacks the square sq. Instead of generating the enemy moves,
+    the attacks of each piece type are looked up from sq itself and compared with where the enemy pieces of that type stand.
+    occupied replaces the board occupancy for the sliding pieces (to look through a piece that is about to move).
+    Nothing is allocated and the GameState is not changed.
+    """
+    def isSquareAttacked(self, sq, byColor, occupied=None):
+        pieces = self.board.pieces
+        pawn, knight, bishop, rook, queen, king, pawnAttacks = ATTACKERS[byColor]
+        #a pawn of byColor attacks sq when a pawn of the other color on sq would attack it
+        if pawnAttacks[sq] & pieces[pawn] or ChessTables.KNIGHT_ATTACKS[sq] & pieces[knight] or \
+            ChessTables.KING_ATTACKS[sq] & pieces[king]:
+            return True
+        if occupied is None:
+            occupied = self.board.occupied
+        queens = pieces[queen]
+        #the rays are only followed when a slider stands somewhere on them
+        rooks = (pieces[rook] | queens) & ChessTables.ROOK_LINES[sq]
+        if rooks and ChessTables.rookAttacks(sq, occupied) & rooks:
+            return True
+        bishops = (pieces[bishop] | queens) & ChessTables.BISHOP_LINES[sq]
+        return bishops != 0 and ChessTables.bishopAttacks(sq, occupied) & bishops != 0
+
+    """
+    Bitboard of the squares of all pieces, of both colors, that attack the square sq (see isSquareAttacked for occupied)
+    """
+    def attackersTo(self, sq, occupied=None):
+        pieces = self.board.pieces
+        if occupied is None:
+            occupied = self.board.occupied
+        return (ChessTables.PAWN_ATTACKS["b"][sq] & pieces["wp"]) | (ChessTables.PAWN_ATTACKS["w"][sq] & pieces["bp"]) | \
+            (ChessTables.KNIGHT_ATTACKS[sq] & (pieces["wN"] | pieces["bN"])) | \
+            (ChessTables.KING_ATTACKS[sq] & (pieces["wK"] | pieces["bK"])) | \
+            (ChessTables.rookAttacks(sq, occupied) & (pieces["wR"] | pieces["bR"] | pieces["wQ"] | pieces["bQ"])) | \
+            (ChessTables.bishopAttacks(sq, occupied) & (pieces["wB"] | pieces["bB"] | pieces["wQ"] | pieces["bQ"]))
+
+    """
+    Static exchange evaluation: the material the side making move wins (or loses, when negative) if both sides keep capturing
+    on its end square, each time with their least valuable attacker, and either side may stop when going on would lose.
+    Sliders lined up behind an attacker (x-rays) join in once the piece in front of them has captured.
+    Works on the bitboards only, no moves are made. Pins are not looked at.
+    """
+    def see(self, move):
+        return self.exchange(move, 0, False)
+
+    """
+    True if the static exchange evaluation of move is at least threshold. Quicker than comparing see(move),
+    as the exchange stops as soon as its outcome is on one side of the threshold.
+    """
+    def seeGE(self, move, threshold=0):
+        return self.exchange(move, threshold, True) >= 0
+
+    """
+    The static exchange evaluation of move minus threshold. With stopEarly the exchange ends once neither side would go on,
+    which keeps the sign of the result but not its value.
+    """
+    def exchange(self, move, threshold, stopEarly):
+        pieces = self.board.pieces
+        sq = move.endRow * 8 + move.endCol
+        occupied = self.board.occupied ^ (1 << (move.startRow * 8 + move.startCol))
+        gain = [(SEE_VALUE[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0) - threshold]
+        onSquare = SEE_VALUE[move.pieceMoved[1]] #value of the piece that may be captured next
+        if move.isPawnPromotion:
+            gain[0] += SEE_VALUE[move.promotionChoice] - SEE_VALUE["p"]
+            onSquare = SEE_VALUE[move.promotionChoice]
+        if move.isEnpassantMove:
+            occupied ^= 1 << (move.startRow * 8 + move.endCol)
+        attackers = self.attackersTo(sq, occupied) & occupied
+        diagonal = pieces["wB"] | pieces["bB"] | pieces["wQ"] | pieces["bQ"]
+        straight = pieces["wR"] | pieces["bR"] | pieces["wQ"] | pieces["bQ"]
+        colors = ("b", "w") if move.pieceMoved[0] == "w" else ("w", "b") #the side to capture next, by depth
+        depth = 0
+        while True:
+            depth += 1
+            gain.append(onSquare - gain[depth - 1]) #what the capture so far is worth if the piece on the square is taken
+            if stopEarly and max(-gain[depth - 1], gain[depth]) < 0: #neither side would go on, the sign can not change
+                break
+            color = colors[(depth + 1) & 1]
+            for pieceType in SEE_ORDER:
+                bb = attackers & pieces[color + pieceType]
+                if bb:
+                    break
+            else: #no attacker left
+                break
+            bit = bb & -bb
+            occupied ^= bit
+            if pieceType != "N" and pieceType != "K": #a slider (or pawn) that moves in may uncover one behind it
+                attackers |= ChessTables.bishopAttacks(sq, occupied) & diagonal | ChessTables.rookAttacks(sq, occupied) & straight
+            attackers &= occupied
+            onSquare = SEE_VALUE[pieceType]
+        for d in range(depth - 1, 0, -1):
+            gain[d - 1] = -max(-gain[d - 1], gain[d])
+        return gain[0]
 
     """
     All moves without considering checks
     """
     def getAllPossibleMoves(self):
         moves  = []
-        for row in range(len(self.board)): #number of rows
-            for col in range(len(self.board[row])): #number of columns in a given row
-                turn = self.board[row][col][0]
-                if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):                    
-                    piece = self.board[row][col][1]
-                    self.moveFunctions[piece](row, col, moves) #calls the appropriate move function based on piece type
+        turn = "w" if self.whiteToMove else "b"
+        for piece in ChessBitboard.PIECE_TYPES:
+            #only visit the squares that actually hold one of our pieces of this type
+            for sq in ChessBitboard.squares(self.board.pieces[turn + piece]):
+                self.moveFunctions[piece](sq >> 3, sq & 7, moves) #calls the appropriate move function based on piece type
         return moves
 
+    """
+    Adds a move from (row, col) to every square of the targets bitboard.
+    While getValidMoves runs, the targets are cut down to the squares that do not leave the king in check.
+    """
+    def addMoves(self, row, col, targets, moves):
+        targets &= self.pinMasks.get(row * 8 + col, self.checkMask)
+        while targets:
+            bit = targets & -targets #lowest set bit
+            sq = bit.bit_length() - 1
+            moves.append(Move((row, col), (sq >> 3, sq & 7), self.board.rows))
+            targets ^= bit
+
     """
     Returns if the player is in check, a list of pins, and a list of checks
     """
@@ -148,22 +535,22 @@ class GameState():
         else:
             enemyColor = 'w'
             allyColor = 'b'
-            startCol = self.blackKingLocation[0]
+            startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
 
         #check outward from king for pins and checks, keep track of pins
-        directions = ((-1,0), (0,-1), (1,0), (0,1), (-1,-1), (-1,1), (1, -1), (1,1)) #first 3 are orthogonal and next 3 are diagonal
+        directions = ChessTables.DIRECTIONS #first 4 are orthogonal and next 4 are diagonal
         for j in range(len(directions)):
             d = directions[j]
             possiblePin = ()
             for i in range(1,8):
-                endRow = startRow + direction[0] * i
-                endCol = startCol + direction[1] * i
+                endRow = startRow + d[0] * i
+                endCol = startCol + d[1] * i
                 if 0 <= endRow < 8 and 0 <= endCol < 8:
                     piece = self.board[endRow][endCol]
-                    if piece[0] == allyColor:
+                    if piece[0] == allyColor and piece[1] != 'K': #our own king is skipped, it may be testing a square it wants to move to
                         if possiblePin == (): #1st allied piece could be pinned
-                            possiblePin(endRow, endCol, direction[0], direction[1])
+                            possiblePin = (endRow, endCol, d[0], d[1])
                         else: #2nd allied piece, so no pin or check possible in this direction
                             break
                     elif piece[0] == enemyColor:
@@ -174,46 +561,33 @@ class GameState():
                         #3.) 1 square away diagonally from king and piece is a pawn
                         #4.) any direction and piece is a queen
                         #5.) any direction 1 square away and piece is a king (this is necessary to prevent a king move to a square controlled by another king)
-                        if (0 <= j <= 3 and type == 'R') or \ 
-                            (4 <= j <= 7 and type == 'B') or \ 
-                            (type == 'Q') or (i == 1 and type == 'K') #if the piece is a king and is 1 away
-                            (i == 1 and type == 'p' and (enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5)):
+                        if (0 <= j <= 3 and type == 'R') or \
+                            (4 <= j <= 7 and type == 'B') or \
+                            (type == 'Q') or (i == 1 and type == 'K') or \
+                            (i == 1 and type == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))):
                             if possiblePin == (): #no piece blocking, so check
                                 inCheck = True
-                                checks.append(endRow, endCol, d[0], d[1])
+                                checks.append((endRow, endCol, d[0], d[1]))
                                 break
                             else: #piece blocking so pin
                                 pins.append(possiblePin)
                                 break
-                        else: #enemy piece not applying checks: #might not need this break
+                        else: #enemy piece not applying checks
                             break
                 else:
                     break #off board
-        
+
         #check for knight checks
-        knightMoves = ((-2, -1), (2,1), (2,-1), (-2,1), (-1,-2), (-1,2), (1,-2), (1,2))
-        for m in knightMoves:
-            endRow = row + m[0]
-            endCol = col + m[1]
+        for m in ChessTables.KNIGHT_OFFSETS:
+            endRow = startRow + m[0]
+            endCol = startCol + m[1]
             if 0 <= endRow < 8 and 0 <= endCol < 8:
                 piece = self.board[endRow][endCol]
                 if piece[0] == enemyColor and piece[1] == 'N': #every knight attacking king
-                    incheck = True
-                    checks.append(endRow, endCol, m[0], m[1])
+                    inCheck = True
+                    checks.append((endRow, endCol, m[0], m[1]))
         return inCheck, pins, checks
 
-
-
-
-
-
-
-
-
-
-
-
-
     """
     Get all the pawn moves for the pawn located at the row, col and add these moves to the list
     White pawns move up the board and black pawns move down the board.
@@ -223,202 +597,133 @@ class GameState():
     If you can make a one-square move, you can possibly make a two-square move.
     """
     def getPawnMoves(self,row, col, moves):
-        if self.whiteToMove == True: #white pawn moves
-            if self.board[row-1][col] == "--" : #One square pawn advance
-                moves.append(Move((row,col), (row-1,col), self.board))
-                if row == 6 and self.board[row-2][col] == "--": #Two square pawn advance
-                    moves.append(Move((row,col), (row-2,col), self.board))
-            
-            #Captures by white pawn:
-            #Capture to the left -> column should be greater than 0. Can't left capture beyond the board limit
-            if col > 0:
-                if self.board[row - 1][col - 1][0] == "b": #black piece to capture
-                    moves.append(Move((row, col), (row-1, col-1), self.board))
-            
-            #Captures to the right -> column should be less than 7
-            if col < 7:
-                if self.board[row - 1][col + 1][0] == "b":
-                    moves.append(Move((row, col), (row -1, col + 1), self.board))
-
-        else: #black pawn moves
-            if self.board[row+1][col] == "--":
-                moves.append(Move((row,col), (row+1, col), self.board))
-                if row == 1 and self.board[row+2][col] == "--":
-                    moves.append(Move((row,col), (row+2,col), self.board))
-
-            #Captures by black pawn:
-            #Capture to the left -> Column should be greater than 0 again
-            if col > 0:
-                if self.board[row+1][col-1][0] == "w": 
-                    moves.append(Move((row, col), (row + 1, col - 1), self.board))
-            
-            #Captures to the right - Column should be less than 7
-            if col < 7:
-                if self.board[row + 1][col + 1][0] == "w":
-                    moves.append(Move((row, col), (row + 1, col + 1), self.board))
+        sq = row * 8 + col
+        if self.whiteToMove:
+            turn, enemy = "w", "b"
+        else:
+            turn, enemy = "b", "w"
+        targets = ChessTables.PAWN_PUSHES[turn][sq] & ~self.board.occupied #one square pawn advance
+        if targets:
+            targets |= ChessTables.PAWN_DOUBLE_PUSHES[turn][sq] & ~self.board.occupied #two square pawn advance
+        targets |= ChessTables.PAWN_ATTACKS[turn][sq] & self.board.occupancy[enemy] #captures
+        if row == (1 if turn == "w" else 6): #every move reaches the last rank, one move per piece the pawn can become
+            targets &= self.pinMasks.get(sq, self.checkMask)
+            for endSq in ChessBitboard.squares(targets):
+                for piece in PROMOTION_PIECES:
+                    moves.append(Move((row, col), (endSq >> 3, endSq & 7), self.board.rows, promotionChoice=piece))
+        else:
+            self.addMoves(row, col, targets, moves)
+        if self.enpassantPossible != ():
+            epRow, epCol = self.enpassantPossible
+            if ChessTables.PAWN_ATTACKS[turn][sq] & (1 << (epRow * 8 + epCol)) and self.enpassantIsLegal(row, col, epRow, epCol):
+                moves.append(Move((row, col), (epRow, epCol), self.board.rows, isEnpassantMove=True))
+
+    """
+    An en passant capture takes two pawns off the same rank at once, which the pins found by checkForPinsAndChecks
+    do not cover. Instead the capture is played out on the occupancy and the king is looked at for sliding attacks.
+    """
+    def enpassantIsLegal(self, row, col, epRow, epCol):
+        capturedSq = row * 8 + epCol
+        endSq = epRow * 8 + epCol
+        if not self.checkMask & (1 << capturedSq | 1 << endSq): #in check, and neither captures the checker nor blocks the check
+            return False
+        if self.whiteToMove:
+            enemy, kingRow, kingCol = "b", self.whiteKingLocation[0], self.whiteKingLocation[1]
+        else:
+            enemy, kingRow, kingCol = "w", self.blackKingLocation[0], self.blackKingLocation[1]
+        pieces = self.board.pieces
+        occupied = self.board.occupied ^ (1 << (row * 8 + col)) ^ (1 << capturedSq) | (1 << endSq)
+        kingSq = kingRow * 8 + kingCol
+        if ChessTables.rookAttacks(kingSq, occupied) & (pieces[enemy + "R"] | pieces[enemy + "Q"]):
+            return False
+        return not ChessTables.bishopAttacks(kingSq, occupied) & (pieces[enemy + "B"] | pieces[enemy + "Q"])
 
-    
     """
     Get all the Rook moves for the Rook located at the row, col and add these moves to the list
-    To things to check:
-    1. Move as many squares as you can until you run into a piece
-    Check going up; is the square above me is empty? if so check the next square until you run into a piece (for loop or while loop)
-    It will be a valid move if run into a opposite color piece or is empty and then you end the loop(break)
-    2. We also stop if we run into the edge of the board
-    DO it in all four directions
+    Each ray goes on until it runs into a piece or the edge of the board, the square of an enemy piece is a capture.
     """
     def getRookMoves(self, row, col, moves):
-        if self.whiteToMove == True: #white Rook moves
-            #Rook moving upward
-            for i in range(1,8):
-                    if row - i < 0: #trying to see the edge of the board. Since here the rook moves upward only, row number should be greater than 0 only
-                        break
-                    if self.board[row - i][col] == "--":
-                        moves.append(Move((row,col), (row - i, col), self.board))
-                    elif self.board[row -i][col][0] == "b":
-                        moves.append(Move((row,col), (row - i, col), self.board))
-                        break
-                    else:
-                        break
-            #Rook moving downward
-            for i in range(1,8):
-                    if row + i > 7 : #trying to see the edge of the board. Since here the rook moves downward only, row number should be less than 8
-                        break
-                    if self.board[row + i][col] == "--":
-                        moves.append(Move((row,col), (row + i, col), self.board))
-                    elif self.board[row + i][col][0] == "b":
-                        moves.append(Move((row,col), (row + i, col), self.board))
-                        break
-                    else:
-                        break
-            #Rook moving rightward
-            for i in range(1,8):
-                    if col + i > 7 : #trying to see the edge of the board. Since here the rook moves rightward only, column number should be less than 8
-                        break
-                    if self.board[row][col + 1] == "--":
-                        moves.append(Move((row,col), (row, col + i), self.board))
-                    elif self.board[row][col + 1][0] == "b":
-                        moves.append(Move((row,col), (row, col + i), self.board))
-                        break
-                    else:
-                        break
-            #Rook moving leftward
-            for i in range(1,8):
-                    if col - i < 0: #trying to see the edge of the board. Since here the rook moves leftward only, row number should be greater than 0 only
-                        break
-                    if self.board[row][col - i] == "--":
-                        moves.append(Move((row,col), (row, col - i), self.board))
-                    elif self.board[row][col - i][0] == "b":
-                        moves.append(Move((row,col), (row, col - i), self.board))
-                        break
-                    else:
-                        break
-        else:
-                        #Rook moving upward
-            for i in range(1,8):
-                    if row - i < 0: #trying to see the edge of the board. Since here the rook moves upward only, row number should be greater than 0 only
-                        break
-                    if self.board[row - i][col] == "--":
-                        moves.append(Move((row,col), (row - i, col), self.board))
-                    elif self.board[row -i][col][0] == "w":
-                        moves.append(Move((row,col), (row - i, col), self.board))
-                        break
-                    else:
-                        break
-            #Rook moving downward
-            for i in range(1,8):
-                    if row + i > 7 : #trying to see the edge of the board. Since here the rook moves downward only, row number should be less than 8
-                        break
-                    if self.board[row + i][col] == "--":
-                        moves.append(Move((row,col), (row + i, col), self.board))
-                    elif self.board[row + i][col][0] == "w":
-                        moves.append(Move((row,col), (row + i, col), self.board))
-                        break
-                    else:
-                        break
-            #Rook moving rightward
-            for i in range(1,8):
-                    if col + i > 7 : #trying to see the edge of the board. Since here the rook moves rightward only, column number should be less than 8
-                        break
-                    if self.board[row][col + 1] == "--":
-                        moves.append(Move((row,col), (row, col + i), self.board))
-                    elif self.board[row][col + 1][0] == "w":
-                        moves.append(Move((row,col), (row, col + i), self.board))
-                        break
-                    else:
-                        break
-            #Rook moving leftward
-            for i in range(1,8):
-                    if col - i < 0: #trying to see the edge of the board. Since here the rook moves leftward only, row number should be greater than 0 only
-                        break
-                    if self.board[row][col - i] == "--":
-                        moves.append(Move((row,col), (row, col - i), self.board))
-                    elif self.board[row][col - i][0] == "w":
-                        moves.append(Move((row,col), (row, col - i), self.board))
-                        break
-                    else:
-                        break
-                    
+        allyPieces = self.board.occupancy["w" if self.whiteToMove else "b"]
+        attacks = ChessTables.rookAttacks(row * 8 + col, self.board.occupied)
+        self.addMoves(row, col, attacks & ~allyPieces, moves)
+
     """
     Get all the Knight moves for the knight located at the row, col and add these moves to the list
-    Similar to the King -> interate over the 8 possible moves, checking for the edge of the board. 
     Dont worry what is around them; worry about the square they are landing on whether its an enemy piece or not.
     """
     def getKnightMoves(self, row, col, moves):
-        knightMoves = ((2,1),(2,-1),(1,2),(1,-2),(-1,2),(-1,-2),(-2,1),(-2,-1))
-        allyPiece = "w" if self.whiteToMove else "b"
-        for move in knightMoves:
-            endRow = row + move[0]
-            endCol = col + move[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if self.board[endRow][endCol][0] != allyPiece:
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
-
+        allyPieces = self.board.occupancy["w" if self.whiteToMove else "b"]
+        self.addMoves(row, col, ChessTables.KNIGHT_ATTACKS[row * 8 + col] & ~allyPieces, moves)
 
     """
     Get all the Bishop moves for the Bishop located at the row, col and add these moves to the list
     Same idea as rook but instead of up down left right we are looking at diagonals
-
     """
     def getBishopMoves(self, row, col, moves):
-        directions = ((1,1),(1,-1),(-1,1),(-1,-1))
-        enemyPiece = "b" if self.whiteToMove else "w"
-        for direction in directions:
-            for i in range(1,8):
-                endRow = row + direction[0] * i
-                endCol = col + direction[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    piece = self.board[endRow][endCol]
-                    if piece == "--" or piece[0] == enemyPiece: 
-                        moves.append(Move((row,col), (endRow, endCol), self.board))
-                    else:
-                        break
-                else:
-                    break
-
+        allyPieces = self.board.occupancy["w" if self.whiteToMove else "b"]
+        attacks = ChessTables.bishopAttacks(row * 8 + col, self.board.occupied)
+        self.addMoves(row, col, attacks & ~allyPieces, moves)
 
     """
     Get all the Queen moves for the Queen located at the row, col and add these moves to the list
-    Mix of bishop and rook. Do at last
+    Mix of bishop and rook: all 8 rays in one lookup.
     """
     def getQueenMoves(self, row, col, moves):
-        self.getBishopMoves(row,col,moves)
-        self.getRookMoves(row,col,moves)
+        allyPieces = self.board.occupancy["w" if self.whiteToMove else "b"]
+        attacks = ChessTables.queenAttacks(row * 8 + col, self.board.occupied)
+        self.addMoves(row, col, attacks & ~allyPieces, moves)
 
     """
     Get all the King moves for the King located at the row, col and add these moves to the list
-    Iterate over the possible 8 squares to see if you can move around. Check for edge of the board.
     """
     def getKingMoves(self, row, col, moves):
-        kingMoves = ((1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1))
-        enemyPiece = "b" if self.whiteToMove else "w"
-        for move in kingMoves:
-            endRow = row + move[0]
-            endCol = col + move[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                piece = self.board[endRow][endCol]
-                if piece == "--" or piece[0] == enemyPiece:
-                    moves.append(Move((row, col), (endRow, endCol), self.board))
+        allyPieces = self.board.occupancy["w" if self.whiteToMove else "b"]
+        self.addMoves(row, col, ChessTables.KING_ATTACKS[row * 8 + col] & ~allyPieces, moves)
+
+    """
+    King moves that do not walk into check. The king is taken off the occupancy while testing, so a sliding piece that checks it
+    also covers the squares behind it.
+    """
+    def getSafeKingMoves(self, row, col, moves):
+        if self.whiteToMove:
+            allyColor, enemyColor = "w", "b"
+        else:
+            allyColor, enemyColor = "b", "w"
+        kingSq = row * 8 + col
+        occupied = self.board.occupied ^ (1 << kingSq)
+        for sq in ChessBitboard.squares(ChessTables.KING_ATTACKS[kingSq] & ~self.board.occupancy[allyColor]):
+            if not self.isSquareAttacked(sq, enemyColor, occupied):
+                moves.append(Move((row, col), (sq >> 3, sq & 7), self.board.rows))
+
+    """
+    Castling moves of the king at (row, col): the right to castle is still there, the squares between king and rook are empty,
+    the rook is on its square, and the king does not pass through or land on an attacked square. Only called when the king is not in check.
+    """
+    def getCastleMoves(self, row, col, moves):
+        if self.whiteToMove:
+            kingside, queenside = WHITE_KINGSIDE, WHITE_QUEENSIDE
+        else:
+            kingside, queenside = BLACK_KINGSIDE, BLACK_QUEENSIDE
+        rowStart = row * 8
+        occupied = self.board.occupied
+        rooks = self.board.pieces[("w" if self.whiteToMove else "b") + "R"]
+        if self.castlingRights & kingside and rooks >> (rowStart + 7) & 1 and not occupied & (0b11 << (rowStart + 5)) and \
+            self.kingSquaresAreSafe(row, col, (5, 6)):
+            moves.append(Move((row, col), (row, 6), self.board.rows, isCastleMove=True))
+        if self.castlingRights & queenside and rooks >> rowStart & 1 and not occupied & (0b111 << (rowStart + 1)) and \
+            self.kingSquaresAreSafe(row, col, (3, 2)):
+            moves.append(Move((row, col), (row, 2), self.board.rows, isCastleMove=True))
+
+    """
+    True if none of the squares (row, endCol) for endCol in cols is attacked
+    """
+    def kingSquaresAreSafe(self, row, col, cols):
+        enemyColor = "b" if self.whiteToMove else "w"
+        occupied = self.board.occupied ^ (1 << (row * 8 + col))
+        for endCol in cols:
+            if self.isSquareAttacked(row * 8 + endCol, enemyColor, occupied):
+                return False
+        return True
         
 class Move():
 
@@ -433,15 +738,34 @@ class Move():
                     "e":4, "f":5, "g":6, "h":7}
     colsToFiles = {v:k for k,v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board):
+    #moves are created by the thousand during move generation, so they only get these fields and no __dict__
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isPawnPromotion", "promotionChoice",
+                 "isEnpassantMove", "isCastleMove", "moveID", "zobristKey", "undoState")
+
+    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False, promotionChoice=None):
         self.startRow = startSq[0] #because startSq is a tuple: (row, col) from the 'SQselected' variable : this one is for source click
         self.startCol = startSq[1]
         self.endRow = endSq[0] #because there are 2 SQselected appended into playerClicks: this one is for dest click
         self.endCol = endSq[1]
         self.pieceMoved = board[self.startRow][self.startCol]
         self.pieceCaptured = board[self.endRow][self.endCol] #returns the captured piece
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol #first 2 numbers will be the start row and col number, second 2 numbers will be the end row and column number
-        print(self.moveID)
+        #pawn promotion: promotionChoice is the piece type the pawn becomes ('Q', 'R', 'B' or 'N')
+        self.isPawnPromotion = promotionChoice is not None
+        self.promotionChoice = promotionChoice
+        #en passant: the captured pawn is not on the end square
+        self.isEnpassantMove = isEnpassantMove
+        if self.isEnpassantMove:
+            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
+        #castle move: the king moves two squares and the rook is moved by makeMove
+        self.isCastleMove = isCastleMove
+        #start square number in the low 6 bits and end square number in the next 6 bits (square number = row * 8 + col),
+        #then 1 + the index of the promotion piece in PROMOTION_PIECES, so each promotion choice is its own move
+        self.moveID = self.startRow * 8 + self.startCol | (self.endRow * 8 + self.endCol) << 6
+        if self.isPawnPromotion:
+            self.moveID |= (PROMOTION_PIECES.index(promotionChoice) + 1) << 12
+        self.zobristKey = None #set by makeMove to the key of the position the move was made from
+        #set by makeMove to (castlingRights, enpassantPossible, halfmoveClock, middlegameScore, endgameScore, phase) from before the move
+        self.undoState = None
 
     """
     Overriding the equals method
@@ -451,6 +775,12 @@ class Move():
             return self.moveID == other.moveID
         else:
             return False
+
+    """
+    Equal moves hash the same, so moves can be kept in sets and used as dictionary keys
+    """
+    def __hash__(self):
+        return self.moveID
     
     def getChessNotation(self):
         #return self.getRankFile(self.startRow, self.startCol) + " "+ self.getRankFile(self.endRow, self.endCol)
@@ -459,5 +789,14 @@ class Move():
 
         return piece + self.getRankFile(self.startRow, self.startCol) + " -> " + piece + self.getRankFile(self.endRow, self.endCol)
 
+    """
+    Start and end square like e2e4, the notation of the UCI protocol
+    """
+    def getUCINotation(self):
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion: #the piece the pawn becomes, e7e8q
+            notation += self.promotionChoice.lower()
+        return notation
+
     def getRankFile(self, row, col):
         return self.colsToFiles[col] + self.rowsToRanks[row] #concatinate to get Notation of a piece like '1a'  
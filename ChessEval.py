@@ -0,0 +1,264 @@
+"""
+Static evaluation: material plus piece-square tables, in centipawns, tapered between a middlegame and an endgame score
+by the game phase (how much material other than pawns is left).
+evaluate scores one GameState by reading the running totals the GameState keeps up to date in makeMove and undoMove.
+evaluateBatch scores many positions at once with NumPy: the positions come in as arrays
+and all of them are scored in one vectorized pass, without going through Python loops per position.
+
+Batch encodings (squares numbered row * 8 + col, row 0 is the 8th rank):
+    (N, 64) int8: the code of the piece on every square, 0 for empty, otherwise 1 + its index in ChessBitboard.PIECES
+    (N, 12, 64) int8: one plane per piece in ChessBitboard.PIECES order, 1 where that piece stands
+"""
+
+import random
+import sys
+import time
+
+import ChessBitboard
+
+numpy = None #only the batch API needs numpy, it is imported on first use so that loading the engine does not pay for it
+
+PIECE_VALUE = {"K": 0, "Q": 900, "R": 500, "B": 330, "N": 320, "p": 100}
+#how much each piece counts towards the game phase: MAX_PHASE with all pieces on the board, 0 with only kings and pawns
+PHASE_WEIGHT = {"K": 0, "Q": 4, "R": 2, "B": 1, "N": 1, "p": 0}
+MAX_PHASE = 24
+
+#bonuses for white pieces by square, written as seen from white's side (the first line is the 8th rank)
+#black uses the same tables flipped upside down
+PIECE_SQUARE_TABLES = {
+    "p": (
+          0,   0,   0,   0,   0,   0,   0,   0,
+         50,  50,  50,  50,  50,  50,  50,  50,
+         10,  10,  20,  30,  30,  20,  10,  10,
+          5,   5,  10,  25,  25,  10,   5,   5,
+          0,   0,   0,  20,  20,   0,   0,   0,
+          5,  -5, -10,   0,   0, -10,  -5,   5,
+          5,  10,  10, -20, -20,  10,  10,   5,
+          0,   0,   0,   0,   0,   0,   0,   0),
+    "N": (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50),
+    "B": (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20),
+    "R": (
+          0,   0,   0,   0,   0,   0,   0,   0,
+          5,  10,  10,  10,  10,  10,  10,   5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+         -5,   0,   0,   0,   0,   0,   0,  -5,
+          0,   0,   0,   5,   5,   0,   0,   0),
+    "Q": (
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20),
+    "K": (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20),
+}
+
+#in the endgame pawns are worth more the further they are, and the king belongs in the centre
+ENDGAME_PIECE_SQUARE_TABLES = dict(PIECE_SQUARE_TABLES, p=(
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0),
+    K=(
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50))
+
+"""
+Value plus square bonus of every piece on every square, positive for white and negative for black
+"""
+def buildPieceSquareScores(tables):
+    scores = {}
+    for piece in ChessBitboard.PIECES:
+        table = tables[piece[1]]
+        value = PIECE_VALUE[piece[1]]
+        if piece[0] == "w":
+            scores[piece] = [value + table[sq] for sq in range(64)]
+        else: #sq ^ 56 is the same square with the rows flipped
+            scores[piece] = [-(value + table[sq ^ 56]) for sq in range(64)]
+    return scores
+
+PIECE_SQUARE_SCORES = buildPieceSquareScores(PIECE_SQUARE_TABLES)
+ENDGAME_PIECE_SQUARE_SCORES = buildPieceSquareScores(ENDGAME_PIECE_SQUARE_TABLES)
+PIECE_CODES = {piece: i + 1 for i, piece in enumerate(ChessBitboard.PIECES)}
+PIECE_CODES["--"] = 0
+
+"""
+Blends the middlegame and endgame scores by the phase: all middlegame at MAX_PHASE, all endgame at 0
+"""
+def taper(middlegame, endgame, phase):
+    phase = min(phase, MAX_PHASE) #promotions can take it past the starting material
+    return (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+"""
+Score of the position in gs from the point of view of the side to move.
+The totals are kept by the GameState as moves are made, so this does not look at the board at all.
+"""
+def evaluate(gs):
+    score = taper(gs.middlegameScore, gs.endgameScore, gs.phase)
+    return score if gs.whiteToMove else -score
+
+"""
+The middlegame score, endgame score and phase of a board, added up square by square.
+GameState starts its running totals from this, and checks them against it in debug mode.
+"""
+def scoreBoard(board):
+    middlegame = endgame = phase = 0
+    for piece, bb in board.pieces.items():
+        middlegameScores = PIECE_SQUARE_SCORES[piece]
+        endgameScores = ENDGAME_PIECE_SQUARE_SCORES[piece]
+        while bb:
+            bit = bb & -bb
+            sq = bit.bit_length() - 1
+            middlegame += middlegameScores[sq]
+            endgame += endgameScores[sq]
+            phase += PHASE_WEIGHT[piece[1]]
+            bb ^= bit
+    return middlegame, endgame, phase
+
+"""
+The piece codes of the 64 squares of gs, one row of the (N, 64) batch encoding
+"""
+def encodePosition(gs):
+    return [PIECE_CODES[piece] for row in gs.board.rows for piece in row]
+
+"""
+Encodes a list of GameStates for evaluateBatch, as (N, 64) codes or as (N, 12, 64) planes
+"""
+def encodeBatch(states, planes=False):
+    requireNumpy()
+    codes = numpy.array([encodePosition(gs) for gs in states], dtype=numpy.int8).reshape(len(states), 64)
+    if not planes:
+        return codes
+    return (codes[:, None, :] == numpy.arange(1, 13, dtype=numpy.int8)[None, :, None]).astype(numpy.int8)
+
+def requireNumpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("the batch evaluation needs numpy")
+
+#middlegame and endgame scores (shape (2, 13, 64)) and phase weights (shape (13,)) by piece code: code 0 is the empty square
+scoreTable = None
+phaseTable = None
+
+def getScoreTable():
+    global scoreTable, phaseTable
+    if scoreTable is None:
+        scoreTable = numpy.zeros((2, 13, 64), dtype=numpy.int32)
+        phaseTable = numpy.zeros(13, dtype=numpy.int32)
+        for piece, code in PIECE_CODES.items():
+            if piece != "--":
+                scoreTable[0, code] = PIECE_SQUARE_SCORES[piece]
+                scoreTable[1, code] = ENDGAME_PIECE_SQUARE_SCORES[piece]
+                phaseTable[code] = PHASE_WEIGHT[piece[1]]
+    return scoreTable
+
+"""
+Scores a batch of positions in one pass. Returns an int32 array of N scores from white's point of view,
+or from the side to move's point of view when whiteToMove (N booleans) is given.
+"""
+def evaluateBatch(positions, whiteToMove=None):
+    requireNumpy()
+    table = getScoreTable()
+    positions = numpy.asarray(positions)
+    if positions.ndim == 2 and positions.shape[1] == 64:
+        #gather the scores of the piece on each square and add up every row
+        codes = positions.astype(numpy.intp)
+        if codes.size and (codes.min() < 0 or codes.max() > len(ChessBitboard.PIECES)):
+            raise ValueError("piece codes must be 0 to %d" % len(ChessBitboard.PIECES))
+        middlegame = table[0][codes, numpy.arange(64)].sum(axis=1, dtype=numpy.int32)
+        endgame = table[1][codes, numpy.arange(64)].sum(axis=1, dtype=numpy.int32)
+        phase = phaseTable[codes].sum(axis=1, dtype=numpy.int32)
+    elif positions.ndim == 3 and positions.shape[1:] == (12, 64):
+        planes = positions.astype(numpy.int32)
+        middlegame = numpy.einsum("npq,pq->n", planes, table[0, 1:])
+        endgame = numpy.einsum("npq,pq->n", planes, table[1, 1:])
+        phase = planes.sum(axis=2) @ phaseTable[1:]
+    else:
+        raise ValueError("positions must have the shape (N, 64) or (N, 12, 64), not %s" % (positions.shape,))
+    phase = numpy.minimum(phase, MAX_PHASE)
+    scores = (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+    if whiteToMove is not None:
+        scores = numpy.where(numpy.asarray(whiteToMove, dtype=bool), scores, -scores)
+    return scores
+
+
+"""
+Scores the same random positions one at a time and as a batch and prints positions per second for both
+"""
+def benchmark(count=20000, out=sys.stdout):
+    import ChessEngine
+    requireNumpy()
+    states = []
+    rng = random.Random(1)
+    gs = ChessEngine.GameState()
+    while len(states) < count:
+        moves = gs.getValidMoves()
+        if len(moves) == 0 or len(gs.moveLog) >= 80:
+            gs = ChessEngine.GameState()
+            continue
+        gs.makeMove(rng.choice(moves))
+        states.append(encodePosition(gs))
+    batch = numpy.array(states, dtype=numpy.int8)
+
+    start = time.perf_counter()
+    for codes in states:
+        middlegame = endgame = phase = 0
+        for sq, code in enumerate(codes):
+            if code:
+                piece = ChessBitboard.PIECES[code - 1]
+                middlegame += PIECE_SQUARE_SCORES[piece][sq]
+                endgame += ENDGAME_PIECE_SQUARE_SCORES[piece][sq]
+                phase += PHASE_WEIGHT[piece[1]]
+        taper(middlegame, endgame, phase)
+    loopSeconds = time.perf_counter() - start
+    start = time.perf_counter()
+    evaluateBatch(batch)
+    batchSeconds = time.perf_counter() - start
+    print("python loop: %.0f positions/s" % (count / loopSeconds), file=out)
+    print("numpy batch: %.0f positions/s" % (count / batchSeconds), file=out)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,10 +1,17 @@
 """
-This is our main driver file. It will be responsible for handling user input and displaying the current 
+This is our main driver file. It will be responsible for handling user input and displaying the current
 GameState object.
+The engine (valid moves and AI replies) works on a background thread and hands its results back as pygame events,
+so the window stays responsive while it thinks. Only the squares that changed are redrawn.
 """
 
+import queue
+import threading
+
 import pygame as p
 import ChessEngine
+import ChessSearch
+import ChessTransposition
 
 
 WIDTH = HEIGHT = 512 #400 is also good option
@@ -12,6 +19,19 @@ DIMENSION = 8 #dimension of a chess board are 8x8
 SQ_SIZE  = HEIGHT // DIMENSION
 MAX_FPS = 15 #for animations later on
 IMAGES = {}
+DIRTY_RECTS = True #redraw only the squares that changed, False redraws the whole board every frame
+PLAYER_ONE = True #True if a human plays white, False if the engine does
+PLAYER_TWO = True #same for black
+AI_TIME_MS = 1000 #how long the engine thinks about a move
+LIGHT_COLOR = p.Color("white") #made once, not for every square of every frame
+DARK_COLOR = p.Color("darkgreen")
+
+#events the engine thread posts: ENGINE_EVENT with kind VALID_MOVES (attribute moves) or AI_MOVE (attribute move)
+ENGINE_EVENT = p.USEREVENT + 1
+VALID_MOVES = "validMoves"
+AI_MOVE = "aiMove"
+#the window has to be drawn again after these (WINDOWEXPOSED is the pygame 2 name)
+EXPOSE_EVENTS = (p.VIDEOEXPOSE, getattr(p, "WINDOWEXPOSED", p.VIDEOEXPOSE))
 
 """
 Initialize a global dictinoary of images. This will be called exactly once in the main.
@@ -20,9 +40,80 @@ Initialize a global dictinoary of images. This will be called exactly once in th
 def loadImages():
     pieces = ['wp', 'wR', 'wN', 'wQ', 'wK', 'wB', 'bp', 'bR', 'bN', 'bQ', 'bK', 'bB']
     for piece in pieces:
-        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece +".png"), (SQ_SIZE, SQ_SIZE)) #transforming the image of the piece taking up the entire size of a square
+        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece +".png"), (SQ_SIZE, SQ_SIZE)).convert_alpha() #transforming the image of the piece taking up the entire size of a square
     #Note: we can access an image by saving 'IMAGES['wp']
 
+
+"""
+Runs the engine work on its own thread. Every job is for one position, numbered by the main loop;
+results are posted as ENGINE_EVENT events carrying that number, so results for a position that is gone can be ignored.
+"""
+class EngineWorker(threading.Thread):
+    def __init__(self, startFEN=ChessEngine.START_FEN):
+        super().__init__(daemon=True)
+        self.startFEN = startFEN #the position the game of the main loop started from
+        self.jobs = queue.Queue()
+        self.stopEvent = threading.Event() #stops a running search
+        self.positionID = 0 #the position the main loop is at, older jobs are skipped
+        self.tt = None #one transposition table for all the searches, made on the worker thread
+
+    """
+    Asks for the valid moves (kind VALID_MOVES) or an AI move (kind AI_MOVE) of the position in gs.
+    The worker gets its own copy of the game, gs stays with the main loop: the position the game started from and
+    the moves made since, so the search sees the earlier positions and knows when a move repeats one.
+    """
+    def submit(self, kind, gs, positionID):
+        self.positionID = positionID
+        self.jobs.put((kind, [move.moveID for move in gs.moveLog], positionID))
+
+    """
+    The position changed: a search still running for an older one is stopped
+    """
+    def cancel(self, positionID):
+        self.positionID = positionID
+        self.stopEvent.set()
+
+    """
+    Ends the thread once the job it is on is done
+    """
+    def stop(self):
+        self.stopEvent.set()
+        self.jobs.put(None)
+
+    """
+    The game of the main loop, played again from its start
+    """
+    def replay(self, moveIDs):
+        gs = ChessEngine.GameState(self.startFEN)
+        for moveID in moveIDs:
+            for move in gs.getValidMoves():
+                if move.moveID == moveID:
+                    gs.makeMove(move)
+                    break
+        return gs
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            kind, moveIDs, positionID = job
+            if positionID != self.positionID: #the position changed while the job waited
+                continue
+            gs = self.replay(moveIDs)
+            if kind == VALID_MOVES:
+                p.event.post(p.event.Event(ENGINE_EVENT, kind=kind, positionID=positionID, moves=gs.getValidMoves()))
+            else:
+                self.stopEvent.clear()
+                if positionID != self.positionID: #a cancel landed before the clear and was wiped out by it
+                    continue
+                if self.tt is None:
+                    self.tt = ChessTransposition.TranspositionTable()
+                result = ChessSearch.search(gs, max_time_ms=AI_TIME_MS, tt=self.tt, stop_event=self.stopEvent)
+                if result.bestMove is not None and positionID == self.positionID:
+                    p.event.post(p.event.Event(ENGINE_EVENT, kind=kind, positionID=positionID, move=result.bestMove))
+
+
 """
 The main driver for our code. This will handle user input and updating the graphics
 """
@@ -33,57 +124,102 @@ def main():
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     gs = ChessEngine.GameState()
-    
-    validMoves = gs.getValidMoves()
+    p.event.set_blocked(p.MOUSEMOTION) #not used, and would wake up the loop for nothing
+
+    engine = EngineWorker()
+    engine.start()
+    positionID = 0 #goes up with every move made or undone
+    validMoves = [] #filled in by the engine, no moves can be made until it answers
+    engine.submit(VALID_MOVES, gs, positionID)
     moveMade = False #flag variable for when a move is made
 
     loadImages()
+    background = drawBoardSurface()
+    drawn = None #the board as it was last drawn, None when everything has to be drawn again
     running = True
 
     SQselected = () #no square is selected, keeps track of the last click of the user (tuple: row, column)
     playerClicks = [] #keeps track of player clicks which is 'piece from' and 'piece to' locations(two tuples: )
-    while running: 
-        for event in p.event.get():
+    while running:
+        #sleep until something happens, so an idle window uses no CPU
+        for event in [p.event.wait()] + p.event.get():
             if event.type == p.QUIT:
                 running = False
 
-            #mouse handlers    
-            elif event.type == p.MOUSEBUTTONDOWN:
+            #mouse handlers
+            elif event.type == p.MOUSEBUTTONDOWN and humanTurn(gs):
                 location = p.mouse.get_pos() #(x,y) location of mouse
                 col = location[0]//SQ_SIZE #because location =column* SQ_SIZE
-                row = location[1]//SQ_SIZE  
+                row = location[1]//SQ_SIZE
                 if SQselected == (row,col): #checks to see if the player selected the same square twice
                     SQselected = () #this deselects the square/piece
                     playerClicks = [] #clear player clicks, renewing the selecting process
-                else: 
+                else:
                     SQselected = (row,col)
                     playerClicks.append(SQselected) #append for both 1st and 2nd click
                 if len(playerClicks) ==2: #after the second click
                     move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
                     print(move.getChessNotation())
 
-                    if move in validMoves:
-                        gs.makeMove(move)
-                        moveMade = True
-                        SQselected = () #reset user click
-                        playerClicks = []
+                    for validMove in validMoves:
+                        #the valid move knows about castling, en passant and promotion, so that is the one to make
+                        #a pawn reaching the last rank becomes a queen
+                        if move.moveID == validMove.moveID & 0xFFF and validMove.promotionChoice in (None, "Q"):
+                            gs.makeMove(validMove)
+                            moveMade = True
+                            validMoves = [] #the next ones come from the engine
+                            SQselected = () #reset user click
+                            playerClicks = []
+                            break
                     else:
                         playerClicks = [SQselected]
-            
+
             #key handlers
             elif event.type == p.KEYDOWN:
                 if event.key == p.K_z: #undo when 'z' is pressed
-                    gs.undoMove(move)
-                    moveMade = True #in order to trigger the moveMade, create another assortment of valid moves 
+                    gs.undoMove()
+                    moveMade = True #in order to trigger the moveMade, create another assortment of valid moves
+                    validMoves = []
+
+            #engine results, only if they are still about the current position
+            elif event.type == ENGINE_EVENT and event.positionID == positionID:
+                if event.kind == VALID_MOVES:
+                    validMoves = event.moves
+                    if not humanTurn(gs) and len(validMoves) > 0:
+                        engine.submit(AI_MOVE, gs, positionID)
+                elif event.kind == AI_MOVE and not moveMade:
+                    gs.makeMove(event.move)
+                    moveMade = True
 
-        if moveMade: #creates another assortment of valid moves
-            validMoves = gs.getValidMoves()
+            elif event.type in EXPOSE_EVENTS: #the window was covered up, draw all of it again
+                drawn = None
+
+        if moveMade: #asks for another assortment of valid moves
+            positionID += 1
+            validMoves = []
+            engine.cancel(positionID)
+            engine.submit(VALID_MOVES, gs, positionID)
             moveMade = False
 
-                
-        drawGameState(screen, gs)
+        if DIRTY_RECTS:
+            rects = drawDirtySquares(screen, background, gs.board, drawn)
+            if drawn is None:
+                p.display.flip()
+            elif rects:
+                p.display.update(rects)
+            drawn = [row[:] for row in gs.board.rows]
+        else:
+            drawGameState(screen, gs)
+            p.display.flip()
         clock.tick(MAX_FPS)
-        p.display.flip()
+    engine.stop()
+
+
+"""
+True when the side to move is played by a human
+"""
+def humanTurn(gs):
+    return (gs.whiteToMove and PLAYER_ONE) or (not gs.whiteToMove and PLAYER_TWO)
 
 
 """
@@ -93,7 +229,7 @@ Responsible for all the graphics within a current game state.
 def drawGameState(screen, gs):
     drawBoard(screen) #draw the squares on the board
     #add in piece highlighting or move suggestions (later)
-    drawPieces(screen, gs.board) #draw the piece on top of those squares 
+    drawPieces(screen, gs.board) #draw the piece on top of those squares
 
 
 
@@ -101,17 +237,24 @@ def drawGameState(screen, gs):
 Draw the squares on the board.
 """
 def drawBoard(screen):
-    colors = [p.Color("white"), p.Color("darkgreen")]
-    for row in range(DIMENSION): #here i and j are rows and columns in the chess board 
+    for row in range(DIMENSION): #here i and j are rows and columns in the chess board
         for column in range(DIMENSION):
             if (row+column) % 2 == 0:
-                SQ_Color = p.Color("white")
+                SQ_Color = LIGHT_COLOR
             else:
-                SQ_Color = p.Color("darkgreen")
+                SQ_Color = DARK_COLOR
 
 
             p.draw.rect(screen, SQ_Color, p.Rect(column*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE)) #draw the rectangle on the SCREEN, with the SQ_Color and the rectangle object with col * row dimensions
 
+"""
+The empty board drawn once on its own surface, so a square is redrawn with one blit from it
+"""
+def drawBoardSurface():
+    background = p.Surface((WIDTH, HEIGHT)).convert()
+    drawBoard(background)
+    return background
+
 """
 Draw the pieces on the board using the current GamState.board
 """
@@ -121,10 +264,28 @@ def drawPieces(screen, board):
             square = board[row][column] #this goes through the row number and then the column number
             if square != "--": #non empty
                 screen.blit(IMAGES[square], p.Rect(column*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-    
-    
+
+"""
+Redraws the squares whose piece is not the one drawn there last time (every square when drawn is None)
+and returns their rectangles, for p.display.update
+"""
+def drawDirtySquares(screen, background, board, drawn):
+    rects = []
+    for row in range(DIMENSION):
+        for column in range(DIMENSION):
+            square = board[row][column]
+            if drawn is not None and drawn[row][column] == square:
+                continue
+            rect = p.Rect(column*SQ_SIZE, row*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+            screen.blit(background, rect, rect) #the empty square
+            if square != "--":
+                screen.blit(IMAGES[square], rect)
+            rects.append(rect)
+    return rects
+
+
 
 
-if __name__ == "__main__": 
-    #reason to do this is if we want to call the main() function in another tab, we will type __main__, otherwise the main() function will only run in this python file 
+if __name__ == "__main__":
+    #reason to do this is if we want to call the main() function in another tab, we will type __main__, otherwise the main() function will only run in this python file
     main()
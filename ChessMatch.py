@@ -0,0 +1,559 @@
+"""
+Self-play matches between two engine configurations, for telling whether a change makes the engine faster or stronger:
+
+    python -m ChessMatch --engine2 ../baseline --openings openings.epd --movetime 100 --games 400 --concurrency 4 --sprt
+
+Each engine runs as its own UCI process (python -m ChessUCI) in its directory, so the two sides can be two checkouts
+of the engine, or one checkout with different UCI options. Games are played in parallel, every game in a worker
+process that keeps its own pair of engines. Every opening (a FEN or EPD file, see ChessEPD) is played twice,
+with the colours swapped, and every move is searched with a fixed time or node budget.
+
+Games end by the rules (checkmate, stalemate, 50 moves, threefold repetition, insufficient material) or are adjudicated:
+a draw once both engines have scored the position close to 0 for a while, a win once both agree that one side is
+clearly winning, a draw when the game gets too long. An illegal move, a crash or a search far over its time loses.
+
+The report gives the nodes per second and average depth of each engine, the Elo difference of engine1 over engine2
+with its 95% error margin, and the verdict of a sequential probability ratio test (SPRT): whether engine1 is at least
+elo1 stronger (H1) or at most elo0 (H0). With --sprt the match stops as soon as the test decides.
+"""
+
+import argparse
+import json
+import math
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import ChessEngine
+import ChessEPD
+import ChessUCI
+
+DEFAULT_MOVETIME_MS = 100
+START_TIMEOUT_S = 30 #for an engine to answer uci and isready
+TIME_MARGIN_S = 2.0 #a search may go over its movetime by this much before it loses on time
+NODES_TIMEOUT_S = 60 #limit for a search with a node or depth budget
+MATE_SCORE = 100000 #mate scores read from info lines, in centipawns
+
+#adjudication
+MAX_PLIES = 400 #a game this long is a draw
+DRAW_MOVE_NUMBER = 40 #draws are only adjudicated from this full move on
+DRAW_SCORE = 10 #centipawns
+DRAW_PLIES = 8 #plies in a row both engines score within DRAW_SCORE of 0
+WIN_SCORE = 1000
+WIN_PLIES = 6 #plies in a row both engines agree one side is WIN_SCORE ahead
+
+#results, from the point of view of engine1
+WIN = 1.0
+DRAW = 0.5
+LOSS = 0.0
+
+
+class EngineConfig():
+    """
+    One side of a match: the directory to start python -m ChessUCI in and the UCI options to set (name: value)
+    """
+    def __init__(self, name, directory=".", options=None):
+        self.name = name
+        self.directory = os.path.abspath(directory)
+        self.options = dict(options or {})
+
+
+class EngineError(Exception):
+    pass
+
+
+class UCIProcess():
+    """
+    A UCI engine running as a child process. Its output is read on a thread, so every read can have a timeout.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.process = subprocess.Popen([sys.executable, "-m", "ChessUCI"], cwd=config.directory,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=self.readOutput, daemon=True).start()
+        self.send("uci")
+        self.readUntil("uciok", START_TIMEOUT_S)
+        for name, value in self.config.options.items():
+            self.send("setoption name %s value %s" % (name, value))
+        self.isReady()
+
+    def readOutput(self):
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+        self.lines.put(None) #the engine is gone
+
+    def send(self, line):
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+        except OSError:
+            raise EngineError("%s: engine is not running" % self.config.name)
+
+    """
+    Reads lines until one starts with prefix and returns the lines read, that one last
+    """
+    def readUntil(self, prefix, timeout):
+        deadline = time.perf_counter() + timeout
+        lines = []
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                raise EngineError("%s: no %s in %.1f s" % (self.config.name, prefix, timeout))
+            if line is None:
+                raise EngineError("%s: engine stopped" % self.config.name)
+            lines.append(line)
+            if line.split(None, 1)[:1] == [prefix]:
+                return lines
+
+    def isReady(self):
+        self.send("isready")
+        self.readUntil("readyok", START_TIMEOUT_S)
+
+    def newGame(self):
+        self.send("ucinewgame")
+        self.isReady()
+
+    """
+    Searches the position reached from fen by moves and returns (move text, SearchInfo)
+    """
+    def go(self, fen, moves, control):
+        self.send("position fen %s%s" % (fen, " moves " + " ".join(moves) if moves else ""))
+        self.send("go %s" % control.goArguments())
+        lines = self.readUntil("bestmove", control.timeout())
+        info = SearchInfo()
+        for line in lines[:-1]:
+            info.read(line)
+        return lines[-1].split()[1] if len(lines[-1].split()) > 1 else "0000", info
+
+    def quit(self):
+        try:
+            self.send("quit")
+            self.process.wait(1)
+        except (EngineError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class TimeControl():
+    """
+    A fixed budget for every move: movetime in milliseconds, nodes, or depth (any of them, at least one)
+    """
+    def __init__(self, movetime=None, nodes=None, depth=None):
+        if movetime is None and nodes is None and depth is None:
+            movetime = DEFAULT_MOVETIME_MS
+        self.movetime = movetime
+        self.nodes = nodes
+        self.depth = depth
+
+    def goArguments(self):
+        return " ".join("%s %d" % (name, value) for name, value in
+            (("movetime", self.movetime), ("nodes", self.nodes), ("depth", self.depth)) if value is not None)
+
+    """
+    How long to wait for a bestmove before the engine loses on time
+    """
+    def timeout(self):
+        if self.movetime is not None:
+            return self.movetime / 1000 + TIME_MARGIN_S
+        return NODES_TIMEOUT_S
+
+
+"""
+What an engine reported about one search: the last info line with a depth
+"""
+class SearchInfo():
+    def __init__(self):
+        self.depth = 0
+        self.nodes = 0
+        self.timeMs = 0
+        self.score = None #centipawns for the side to move, None when the engine gave none (a book move)
+
+    def read(self, line):
+        tokens = line.split()
+        if not tokens or tokens[0] != "info" or "depth" not in tokens or "string" in tokens:
+            return
+        i = 1
+        while i + 1 < len(tokens):
+            name = tokens[i]
+            if name == "pv":
+                break
+            if name == "score" and i + 2 < len(tokens):
+                value = int(tokens[i + 2])
+                self.score = value if tokens[i + 1] == "cp" else (MATE_SCORE if value > 0 else -MATE_SCORE)
+                i += 3
+                continue
+            if name in ("depth", "nodes", "time"):
+                setattr(self, "timeMs" if name == "time" else name, int(tokens[i + 1]))
+                i += 2
+                continue
+            i += 1
+
+
+"""
+True when neither side has the material left to checkmate: bare kings, or one knight or bishop against a bare king
+"""
+def isInsufficientMaterial(gs):
+    pieces = gs.board.pieces
+    for piece in ("wp", "bp", "wR", "bR", "wQ", "bQ"):
+        if pieces[piece]:
+            return False
+    minors = sum(pieces[piece].bit_count() for piece in ("wN", "bN", "wB", "bB"))
+    return minors <= 1
+
+
+"""
+Decides the game from the scores both engines gave for their last moves, or returns None.
+scores holds the score of every move from white's point of view, None for moves without one.
+"""
+def adjudicate(gs, scores):
+    if len(scores) >= DRAW_PLIES and gs.fullmoveNumber >= DRAW_MOVE_NUMBER:
+        last = scores[-DRAW_PLIES:]
+        if all(score is not None and abs(score) <= DRAW_SCORE for score in last):
+            return DRAW, "adjudicated draw"
+    if len(scores) >= WIN_PLIES:
+        last = scores[-WIN_PLIES:]
+        if all(score is not None and score >= WIN_SCORE for score in last):
+            return "w", "adjudicated win"
+        if all(score is not None and score <= -WIN_SCORE for score in last):
+            return "b", "adjudicated win"
+    return None
+
+
+"""
+The result of the position by the rules once the game is over, as "w", "b" or DRAW with the reason, or None
+"""
+def gameOver(gs, keys):
+    if len(gs.getValidMoves()) == 0:
+        if gs.checkMate:
+            return ("b" if gs.whiteToMove else "w"), "checkmate"
+        return DRAW, "stalemate"
+    if gs.halfmoveClock >= 100:
+        return DRAW, "50 moves"
+    if keys.count(gs.zobristKey) >= 3:
+        return DRAW, "threefold repetition"
+    if isInsufficientMaterial(gs):
+        return DRAW, "insufficient material"
+    return None
+
+
+#set up in every worker process by initWorker
+workerConfigs = None
+workerEngines = None
+
+
+def initWorker(configs):
+    global workerConfigs, workerEngines
+    workerConfigs = configs
+    workerEngines = [None, None] #started on the first game and again after a crash
+
+def getEngine(index):
+    if workerEngines[index] is None:
+        workerEngines[index] = UCIProcess(workerConfigs[index])
+    return workerEngines[index]
+
+"""
+Plays one game in a worker. engine1White says which engine has white.
+Returns a dictionary with the result for engine1, the reason, the plies and the searches of both engines.
+"""
+def playGame(fen, engine1White, control):
+    engines = [None, None]
+    searches = [[0, 0, 0, 0], [0, 0, 0, 0]] #per engine: searches, depth total, nodes, time ms
+    gs = ChessEngine.GameState(fen)
+    fen = gs.getFEN()
+    moves = []
+    keys = [gs.zobristKey]
+    scores = []
+    outcome = None
+    try:
+        for index in (0, 1):
+            engines[index] = getEngine(index)
+            engines[index].newGame()
+        while outcome is None:
+            outcome = gameOver(gs, keys)
+            if outcome is not None:
+                break
+            if len(moves) >= MAX_PLIES:
+                outcome = DRAW, "too long"
+                break
+            index = 0 if gs.whiteToMove == engine1White else 1
+            loser = "b" if gs.whiteToMove else "w"
+            try:
+                text, info = engines[index].go(fen, moves, control)
+            except EngineError as error:
+                workerEngines[index] = None #started again for the next game
+                engines[index].quit()
+                outcome = loser, "engine failure: %s" % error
+                break
+            try:
+                move = ChessUCI.uciToMove(gs, text)
+            except ValueError:
+                outcome = loser, "illegal move %s" % text
+                break
+            stats = searches[index]
+            if info.depth > 0:
+                stats[0] += 1
+                stats[1] += info.depth
+                stats[2] += info.nodes
+                stats[3] += info.timeMs
+            scores.append(None if info.score is None else (info.score if gs.whiteToMove else -info.score))
+            gs.makeMove(move)
+            moves.append(text)
+            keys.append(gs.zobristKey)
+            if gs.halfmoveClock == 0: #no position before a capture or pawn move can come back
+                keys = [gs.zobristKey]
+            outcome = adjudicate(gs, scores)
+    except EngineError as error: #an engine did not start: no result for this game
+        for index in (0, 1):
+            if workerEngines[index] is not None:
+                workerEngines[index].quit()
+                workerEngines[index] = None
+        return {"error": str(error)}
+    winner, reason = outcome
+    if winner == DRAW:
+        result = DRAW
+    else:
+        result = WIN if (winner == "w") == engine1White else LOSS
+    return {"result": result, "reason": reason, "plies": len(moves), "engine1White": engine1White, "fen": fen,
+        "moves": moves, "engine1": searches[0], "engine2": searches[1]}
+
+
+"""
+Expected score of the stronger side for an Elo difference
+"""
+def expectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+"""
+Elo difference for a score fraction. A score of 0 or 1 has no finite Elo, it is clamped.
+"""
+def eloFromScore(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+"""
+(Elo difference, 95% error margin) of engine1 from its wins, draws and losses
+"""
+def eloDifference(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return eloFromScore(score), (eloFromScore(score + margin) - eloFromScore(score - margin)) / 2
+
+"""
+Sequential probability ratio test of H0: engine1 is elo0 stronger against H1: it is elo1 stronger,
+with the normal approximation of the log likelihood ratio. Returns (llr, lower bound, upper bound, verdict)
+where verdict is "H1" (accept the change), "H0" (reject it) or None (play more games).
+"""
+def sprt(wins, draws, losses, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0, lower, upper, None
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0, lower, upper, None
+    s0 = expectedScore(elo0)
+    s1 = expectedScore(elo1)
+    llr = games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+    verdict = "H1" if llr >= upper else "H0" if llr <= lower else None
+    return llr, lower, upper, verdict
+
+
+class MatchResult():
+    def __init__(self, configs):
+        self.configs = configs
+        self.wins = 0 #for engine1
+        self.draws = 0
+        self.losses = 0
+        self.errors = 0
+        self.reasons = {}
+        self.searches = [[0, 0, 0, 0], [0, 0, 0, 0]] #as in playGame
+        self.seconds = 0.0
+
+    def add(self, game):
+        if "error" in game:
+            self.errors += 1
+            return
+        if game["result"] == WIN:
+            self.wins += 1
+        elif game["result"] == DRAW:
+            self.draws += 1
+        else:
+            self.losses += 1
+        self.reasons[game["reason"]] = self.reasons.get(game["reason"], 0) + 1
+        for total, searches in zip(self.searches, (game["engine1"], game["engine2"])):
+            for i in range(4):
+                total[i] += searches[i]
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def toDict(self, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+        elo, margin = eloDifference(self.wins, self.draws, self.losses)
+        llr, lower, upper, verdict = sprt(self.wins, self.draws, self.losses, elo0, elo1, alpha, beta)
+        engines = {}
+        for config, (count, depth, nodes, timeMs) in zip(self.configs, self.searches):
+            engines[config.name] = {
+                "searches": count,
+                "nps": int(nodes * 1000 / timeMs) if timeMs > 0 else 0,
+                "averageDepth": round(depth / count, 2) if count else 0.0,
+                "averageNodes": int(nodes / count) if count else 0,
+            }
+        return {
+            "games": self.games(),
+            "wins": self.wins,
+            "draws": self.draws,
+            "losses": self.losses,
+            "errors": self.errors,
+            "score": round((self.wins + self.draws / 2) / self.games(), 4) if self.games() else 0.0,
+            "elo": round(elo, 1),
+            "eloMargin": round(margin, 1),
+            "sprt": {"elo0": elo0, "elo1": elo1, "alpha": alpha, "beta": beta,
+                "llr": round(llr, 3), "lower": round(lower, 3), "upper": round(upper, 3), "verdict": verdict},
+            "engines": engines,
+            "reasons": dict(self.reasons),
+            "seconds": round(self.seconds, 1),
+        }
+
+
+"""
+The opening FENs of a FEN or EPD file, or just the start position without one
+"""
+def readOpenings(path=None):
+    if path is None:
+        return [ChessEngine.START_FEN]
+    openings = [gs.getFEN() for gs, operations in ChessEPD.readPositions(path)]
+    if not openings:
+        raise ValueError("no positions in %s" % path)
+    return openings
+
+"""
+Plays the match: games games (every opening twice, colours swapped, the openings used over again when there are
+more games than that), concurrency of them at a time. With stopOnVerdict the match ends once the SPRT decides.
+onGame is called with every finished game and the MatchResult so far, for progress reports.
+"""
+def runMatch(configs, openings, control, games, concurrency=None, stopOnVerdict=False, sprtBounds=(0.0, 5.0, 0.05, 0.05),
+        onGame=None):
+    concurrency = concurrency or os.cpu_count()
+    result = MatchResult(configs)
+    start = time.perf_counter()
+    schedule = ((openings[(i // 2) % len(openings)], i % 2 == 0) for i in range(games))
+    with ProcessPoolExecutor(concurrency, initializer=initWorker, initargs=(configs,)) as pool:
+        running = set()
+        for fen, engine1White in schedule:
+            if len(running) < concurrency * 2: #a few queued per worker, the rest are only submitted as games finish
+                running.add(pool.submit(playGame, fen, engine1White, control))
+                continue
+            if collect(running, result, onGame, stopOnVerdict, sprtBounds):
+                break
+            running.add(pool.submit(playGame, fen, engine1White, control))
+        else:
+            while running and not collect(running, result, onGame, stopOnVerdict, sprtBounds):
+                pass
+        for future in running: #left over when the SPRT decided
+            future.cancel()
+    result.seconds = time.perf_counter() - start
+    return result
+
+"""
+Waits for at least one game of running to finish and adds it to result. Returns True when the match can stop.
+"""
+def collect(running, result, onGame, stopOnVerdict, sprtBounds):
+    done, pending = wait(running, return_when=FIRST_COMPLETED)
+    running.difference_update(done)
+    for future in done:
+        game = future.result()
+        result.add(game)
+        if onGame is not None:
+            onGame(game, result)
+    return stopOnVerdict and sprt(result.wins, result.draws, result.losses, *sprtBounds)[3] is not None
+
+
+"""
+The report of a finished match, as text lines
+"""
+def formatReport(report):
+    lines = ["%d games: +%d =%d -%d (%d errors), score %.1f%%" % (report["games"], report["wins"], report["draws"],
+        report["losses"], report["errors"], report["score"] * 100)]
+    for name, engine in report["engines"].items():
+        lines.append("%-12s %10d nodes/s  average depth %5.2f  %d searches" % (name, engine["nps"], engine["averageDepth"],
+            engine["searches"]))
+    lines.append("Elo difference %+.1f +/- %.1f" % (report["elo"], report["eloMargin"]))
+    test = report["sprt"]
+    verdict = {"H1": "H1 accepted (engine1 is stronger)", "H0": "H0 accepted (no improvement)", None: "inconclusive"}[test["verdict"]]
+    lines.append("SPRT elo0 %g elo1 %g alpha %g beta %g: LLR %.3f (%.3f, %.3f) %s" % (test["elo0"], test["elo1"], test["alpha"],
+        test["beta"], test["llr"], test["lower"], test["upper"], verdict))
+    lines.append("endings: " + ", ".join("%s %d" % item for item in sorted(report["reasons"].items())))
+    lines.append("%.1f s" % report["seconds"])
+    return lines
+
+
+"""
+Reads NAME=VALUE option arguments into a dictionary
+"""
+def readOptions(pairs):
+    options = {}
+    for pair in pairs or []:
+        name, equals, value = pair.partition("=")
+        if not equals:
+            raise ValueError("an option is NAME=VALUE: %r" % pair)
+        options[name] = value
+    return options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a self-play match between two engine configurations.")
+    parser.add_argument("--engine1", default=".", help="directory of the engine under test (default: this checkout)")
+    parser.add_argument("--engine2", default=".", help="directory of the engine to compare with (default: this checkout)")
+    parser.add_argument("--option1", action="append", metavar="NAME=VALUE", help="UCI option for engine1, may be repeated")
+    parser.add_argument("--option2", action="append", metavar="NAME=VALUE", help="UCI option for engine2, may be repeated")
+    parser.add_argument("--openings", help="FEN or EPD file of opening positions (default: the start position)")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=None, help="games played at a time (default: one per core)")
+    parser.add_argument("--movetime", type=int, help="milliseconds per move")
+    parser.add_argument("--nodes", type=int, help="nodes per move")
+    parser.add_argument("--depth", type=int, help="depth per move")
+    parser.add_argument("--sprt", action="store_true", help="stop as soon as the SPRT decides")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=5.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--quiet", action="store_true", help="no line per finished game")
+    args = parser.parse_args(argv)
+
+    configs = (EngineConfig("engine1", args.engine1, readOptions(args.option1)),
+               EngineConfig("engine2", args.engine2, readOptions(args.option2)))
+    control = TimeControl(args.movetime, args.nodes, args.depth)
+    bounds = (args.elo0, args.elo1, args.alpha, args.beta)
+    def onGame(game, result):
+        if not args.quiet:
+            if "error" in game:
+                print("game %d: %s" % (result.games() + result.errors, game["error"]), file=sys.stderr)
+            else:
+                print("game %d: engine1 %s with %s (%s, %d plies)  +%d =%d -%d" % (result.games() + result.errors,
+                    {WIN: "wins", DRAW: "draws", LOSS: "loses"}[game["result"]], "white" if game["engine1White"] else "black",
+                    game["reason"], game["plies"], result.wins, result.draws, result.losses), file=sys.stderr)
+    result = runMatch(configs, readOpenings(args.openings), control, args.games, args.concurrency, args.sprt, bounds, onGame)
+    report = result.toDict(*bounds)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for line in formatReport(report):
+            print(line)
+    #as a gate: fails when the test rejected the change
+    return 1 if report["sprt"]["verdict"] == "H0" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
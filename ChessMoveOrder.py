@@ -0,0 +1,155 @@
+"""
+Move ordering for the alpha-beta search. The sooner the best move is tried, the sooner the rest of a node is cut off,
+so moves are handed out in stages:
+    1. the hash move (the best move found for the position before, from the transposition table)
+    2. captures and promotions that do not lose material (by static exchange evaluation), by MVV-LVA:
+       most valuable victim first, then least valuable attacker
+    3. killer moves: quiet moves that caused a cutoff at the same ply in a sibling node
+    4. the other quiet moves, by their history score (how often moving between those two squares caused cutoffs)
+    5. captures that lose material
+Each stage is only sorted when the search gets to it, so a cutoff in an early stage skips the work of the later ones.
+"""
+
+import random
+import sys
+import time
+
+import ChessEval
+
+MAX_PLY = 128
+KILLERS_PER_PLY = 2
+HISTORY_MAX = 1 << 20 #history scores are halved when one gets this big, so old results fade out
+SQUARES_MASK = 0xFFF #start and end square part of a moveID, the index into the history table
+
+#victims are worth a lot more than the attacker costs, so any capture of a bigger piece comes first
+VICTIM_SCALE = 10
+
+
+"""
+True when the capture can not lose material, whatever the exchange on its square: the victim is worth at least the attacker.
+Only the other captures need a static exchange evaluation.
+"""
+def isSafeCapture(move):
+    return move.pieceCaptured != "--" and ChessEval.PIECE_VALUE[move.pieceCaptured[1]] >= ChessEval.PIECE_VALUE[move.pieceMoved[1]] \
+        and move.pieceMoved[1] != "K"
+
+"""
+MVV-LVA score of a capture (promotions count the piece the pawn becomes as won material)
+"""
+def mvvLva(move):
+    score = 0
+    if move.pieceCaptured != "--":
+        score = ChessEval.PIECE_VALUE[move.pieceCaptured[1]] * VICTIM_SCALE - ChessEval.PIECE_VALUE[move.pieceMoved[1]]
+    if move.isPawnPromotion:
+        score += ChessEval.PIECE_VALUE[move.promotionChoice] * VICTIM_SCALE
+    return score
+
+
+class MoveOrderer():
+    def __init__(self):
+        self.killers = [[None] * KILLERS_PER_PLY for ply in range(MAX_PLY)] #moveIDs, newest first
+        self.history = [0] * 4096 #butterfly table indexed by start square | end square << 6
+
+    """
+    Forgets the killers and history, for a new game
+    """
+    def clear(self):
+        for killers in self.killers:
+            killers[:] = [None] * KILLERS_PER_PLY
+        self.history = [0] * 4096
+
+    """
+    Records a quiet move that caused a beta cutoff: it becomes the newest killer at its ply and its history score goes up.
+    Deeper subtrees count for more, as their cutoffs save more work.
+    """
+    def recordCutoff(self, move, depth, ply):
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move.moveID:
+                killers.insert(0, move.moveID)
+                killers.pop()
+        index = move.moveID & SQUARES_MASK
+        self.history[index] += depth * depth
+        if self.history[index] >= HISTORY_MAX:
+            self.history = [score // 2 for score in self.history]
+
+    """
+    Yields the moves in search order, one stage at a time (see the top of the file).
+    Losing captures are only told apart when gs, the GameState the moves belong to, is given.
+    """
+    def orderedMoves(self, moves, hashMoveID=None, ply=0, gs=None):
+        if hashMoveID is not None:
+            for move in moves:
+                if move.moveID == hashMoveID:
+                    yield move
+                    break
+            else: #not a valid move here (an old entry or a key collision)
+                hashMoveID = None
+        captures = []
+        quiets = []
+        for move in moves:
+            if move.moveID == hashMoveID:
+                continue
+            if move.pieceCaptured != "--" or move.isPawnPromotion:
+                captures.append(move)
+            else:
+                quiets.append(move)
+        losingCaptures = []
+        if gs is not None:
+            goodCaptures = []
+            for move in captures:
+                if isSafeCapture(move) or gs.seeGE(move):
+                    goodCaptures.append(move)
+                else:
+                    losingCaptures.append(move)
+            captures = goodCaptures
+        captures.sort(key=mvvLva, reverse=True)
+        yield from captures
+        if ply < MAX_PLY:
+            for killerID in self.killers[ply]:
+                for i in range(len(quiets)):
+                    if quiets[i].moveID == killerID:
+                        yield quiets.pop(i)
+                        break
+        history = self.history
+        quiets.sort(key=lambda move: history[move.moveID & SQUARES_MASK], reverse=True)
+        yield from quiets
+        losingCaptures.sort(key=mvvLva, reverse=True)
+        yield from losingCaptures
+
+    """
+    Captures (and promotions) only, by MVV-LVA, for the quiescence search
+    """
+    def orderCaptures(self, moves):
+        return sorted(moves, key=mvvLva, reverse=True)
+
+
+"""
+Runs the static exchange evaluation on every capture of random positions and prints SEE calls per second
+"""
+def benchmarkSEE(count=2000, out=sys.stdout):
+    import ChessEngine
+    captures = []
+    rng = random.Random(1)
+    gs = ChessEngine.GameState()
+    while len(captures) < count:
+        moves = gs.getValidMoves()
+        if len(moves) == 0 or len(gs.moveLog) >= 100:
+            gs = ChessEngine.GameState()
+            continue
+        position = ChessEngine.GameState(gs.getFEN()) #a copy that stays at this position, gs plays on
+        captures.extend((position, move) for move in moves if move.pieceCaptured != "--")
+        gs.makeMove(rng.choice(moves))
+    captures = captures[:count]
+    start = time.perf_counter()
+    rounds = 0
+    while time.perf_counter() - start < 1.0:
+        for position, move in captures:
+            position.see(move)
+        rounds += 1
+    seconds = time.perf_counter() - start
+    print("%d captures: %.0f SEE calls/s" % (len(captures), rounds * len(captures) / seconds), file=out)
+
+
+if __name__ == "__main__":
+    benchmarkSEE()
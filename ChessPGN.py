@@ -0,0 +1,166 @@
+"""
+Streaming PGN reader. Games are read from the file one at a time (plain, gzip compressed or memory-mapped),
+so a database of millions of games is replayed in constant memory.
+Each move of a game is matched to a Move of getValidMoves through an index keyed by piece and end square,
+instead of building the notation of every valid move and comparing strings, and then played with makeMove.
+
+    python ChessPGN.py games.pgn [--mmap]    replays every game and reports games per second
+"""
+
+import re
+import sys
+import time
+
+import ChessEngine
+import ChessEPD
+
+#piece letter, from file, from rank, capture, end square, promotion
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+
+
+"""
+One game: its tag pairs (Event, White, Result, ...) and its moves in SAN
+"""
+class PGNGame():
+    def __init__(self, headers, sanMoves):
+        self.headers = headers
+        self.sanMoves = sanMoves
+
+    """
+    A GameState set up at the starting position of the game (its FEN tag if it has one)
+    """
+    def startPosition(self):
+        return ChessEngine.GameState(self.headers.get("FEN"))
+
+
+"""
+Splits the movetext of a game into SAN moves, leaving out move numbers, comments, variations, NAGs and the result
+"""
+def parseMovetext(text):
+    moves = []
+    depth = 0 #how deep inside variations we are
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "{": #comment up to the closing brace
+            end = text.find("}", i)
+            i = len(text) if end == -1 else end + 1
+            continue
+        if char == ";": #comment up to the end of the line
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end + 1
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif not char.isspace():
+            end = i
+            while end < len(text) and not text[end].isspace() and text[end] not in "{;()":
+                end += 1
+            token = MOVE_NUMBER.sub("", text[i:end])
+            if depth == 0 and token and token not in RESULTS and not token.startswith("$"):
+                moves.append(token)
+            i = end
+            continue
+        i += 1
+    return moves
+
+"""
+Yields every game of a PGN file as a PGNGame, reading only one game into memory at a time
+"""
+def readGames(path, useMmap=False):
+    headers = {}
+    movetext = []
+    for line in ChessEPD.readLines(path, useMmap):
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            if any(text.strip() for text in movetext): #a tag after movetext starts the next game
+                yield PGNGame(headers, parseMovetext("".join(movetext)))
+                headers = {}
+            movetext = [] #blank lines before or between the tags are not movetext
+            key, _, value = stripped[1:-1].partition(" ")
+            headers[key] = value.strip().strip('"')
+        elif stripped.startswith("%"): #escaped line
+            continue
+        else:
+            movetext.append(line)
+    if headers or any(line.strip() for line in movetext):
+        yield PGNGame(headers, parseMovetext("".join(movetext)))
+
+"""
+Groups valid moves by (piece type, end row, end col), the part of a SAN move that is always written out
+"""
+def sanIndex(moves):
+    index = {}
+    for move in moves:
+        key = (move.pieceMoved[1], move.endRow, move.endCol)
+        if key in index:
+            index[key].append(move)
+        else:
+            index[key] = [move]
+    return index
+
+"""
+Finds the Move in the valid moves of gs that a SAN string stands for. Raises ValueError if there is none or more than one.
+"""
+def sanToMove(gs, san, moves=None):
+    if moves is None:
+        moves = gs.getValidMoves()
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"): #castling is the king moving two squares
+        row = gs.whiteKingLocation[0] if gs.whiteToMove else gs.blackKingLocation[0]
+        candidates = sanIndex(moves).get(("K", row, 6 if len(text) == 3 else 2), [])
+        candidates = [move for move in candidates if move.startCol == 4]
+    else:
+        match = SAN_PATTERN.match(text)
+        if match is None:
+            raise ValueError("can not read the move %r" % san)
+        piece, fromFile, fromRank, capture, endSquare, promotion = match.groups()
+        endRow = ChessEngine.Move.ranksToRows[endSquare[1]]
+        endCol = ChessEngine.Move.filesToCols[endSquare[0]]
+        candidates = sanIndex(moves).get((piece or "p", endRow, endCol), [])
+        if fromFile is not None:
+            candidates = [move for move in candidates if move.startCol == ChessEngine.Move.filesToCols[fromFile]]
+        if fromRank is not None:
+            candidates = [move for move in candidates if move.startRow == ChessEngine.Move.ranksToRows[fromRank]]
+        candidates = [move for move in candidates if move.promotionChoice == promotion]
+    if len(candidates) != 1:
+        raise ValueError("%s move %r in %s" % ("illegal" if not candidates else "ambiguous", san, gs.getFEN()))
+    return candidates[0]
+
+"""
+Plays the moves of a game one by one and yields (ply, move, gs) after each of them.
+gs is the same GameState every time, updated in place, so read what is needed (zobristKey, getFEN(), ...) before the next step.
+"""
+def replayGame(game, gs=None):
+    if gs is None:
+        gs = game.startPosition()
+    for ply, san in enumerate(game.sanMoves, 1):
+        move = sanToMove(gs, san)
+        gs.makeMove(move)
+        yield ply, move, gs
+
+
+"""
+Replays every game of a file and prints how many games and plies per second were replayed
+"""
+def benchmark(path, useMmap=False, out=sys.stdout):
+    start = time.perf_counter()
+    games = plies = errors = 0
+    for game in readGames(path, useMmap):
+        games += 1
+        try:
+            for ply, move, gs in replayGame(game):
+                plies += 1
+        except ValueError:
+            errors += 1
+    seconds = time.perf_counter() - start
+    print("%d games (%d with errors), %d plies in %.3f s: %.1f games/s, %.0f plies/s" % (games, errors, plies, seconds,
+        games / seconds if seconds > 0 else 0.0, plies / seconds if seconds > 0 else 0.0), file=out)
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1], "--mmap" in sys.argv[2:])
@@ -0,0 +1,133 @@
+"""
+Parallel search over several processes (Lazy SMP). Every worker process searches its own copy of the GameState,
+and all of them share one transposition table in shared memory, so what one worker finds out the others can use.
+Half the workers start one depth deeper than the others, which spreads them over different parts of the tree.
+The results are merged deterministically: the deepest finished search wins, and on equal depth the lowest worker index wins.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import ChessSearch
+import ChessStats
+import ChessTransposition
+
+#workers are started fresh instead of forked: a fork copies whatever the other threads of the parent hold at that moment,
+#and a parent that is blocked reading stdin on one thread (as the UCI front-end is) deadlocks the forked worker
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+#set up in every worker process by initWorker
+workerMemory = None
+workerTT = None
+workerStop = None
+
+
+def initWorker(memoryName, stopEvent):
+    global workerMemory, workerTT, workerStop
+    workerMemory = shared_memory.SharedMemory(name=memoryName) #the parent owns the shared memory and unlinks it
+    workerTT = ChessTransposition.TranspositionTable(buffer=workerMemory.buf)
+    workerStop = stopEvent
+
+"""
+Searches in a worker. With collectStats the search fills in a ChessStats.SearchStats, which is sent back as well.
+"""
+def searchWorker(gs, workerIndex, maxTimeMs, maxNodes, depth, generation, collectStats=False):
+    #every worker has its own copy of the generation counter and a worker may run any number of searches, so the parent
+    #hands out the generation: all workers then write the same one and keep each other's deep entries.
+    #iterativeDeepening's newSearch moves it on to generation.
+    workerTT.generation = (generation - 1) & 0xFF
+    stats = ChessStats.SearchStats() if collectStats else None
+    searcher = ChessSearch.makeSearcher(gs, maxTimeMs, maxNodes, workerTT, workerStop, stats)
+    result = searcher.iterativeDeepening(depth, 1 + workerIndex % 2)
+    #moves are sent back as IDs, the parent matches them to its own Move objects
+    return result.depth, result.score, [move.moveID for move in result.pv], result.nodes, stats
+
+
+class ParallelSearch():
+    """
+    Starts the worker processes and the shared transposition table. They are kept between searches, call close() when done.
+    """
+    def __init__(self, workers=None, hashMb=ChessTransposition.DEFAULT_SIZE_MB):
+        self.workers = workers or multiprocessing.cpu_count()
+        context = multiprocessing.get_context(START_METHOD)
+        size = max(1, int(hashMb * ChessTransposition.MB) // ChessTransposition.BUCKET_BYTES) * ChessTransposition.BUCKET_BYTES
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.memory.buf[:size] = bytes(size)
+        self.stopEvent = context.Event() #handed to the workers when they start
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=initWorker,
+            initargs=(self.memory.name, self.stopEvent))
+        self.generation = 0 #of the shared table, the same in every worker for one search
+
+    """
+    Same budgets as ChessSearch.search. max_nodes is the total, it is shared out evenly between the workers.
+    Returns a ChessSearch.SearchResult whose node count is the sum over all workers.
+    A ChessStats.SearchStats passed as stats is filled in with the statistics of the main worker (worker 0).
+    """
+    def search(self, gs, max_time_ms=None, max_nodes=None, depth=None, stats=None):
+        if depth is None:
+            depth = ChessSearch.DEPTH if max_time_ms is None and max_nodes is None else ChessSearch.MAX_DEPTH
+        workerNodes = max(1, max_nodes // self.workers) if max_nodes is not None else None
+        startTime = time.perf_counter()
+        self.stopEvent.clear()
+        self.generation = (self.generation + 1) & 0xFF
+        futures = [self.pool.submit(searchWorker, gs, i, max_time_ms, workerNodes, depth, self.generation, stats is not None and i == 0)
+            for i in range(self.workers)]
+        results = [futures[0].result()]
+        self.stopEvent.set() #the main worker is done, the helpers stop as well
+        results += [future.result() for future in futures[1:]]
+
+        best = None
+        for result in results: #deepest search first, the earlier worker on equal depth
+            if best is None or result[0] > best[0]:
+                best = result
+        resultDepth, score, pvIDs, nodes = best[:4]
+        if stats is not None:
+            stats.__dict__.update(results[0][4].__dict__)
+        pv = self.movesFromIDs(gs, pvIDs)
+        bestMove = pv[0] if pv else None
+        if bestMove is None: #no worker finished depth 1
+            moves = gs.getValidMoves()
+            bestMove = moves[0] if moves else None
+            pv = [bestMove] if bestMove else []
+        return ChessSearch.SearchResult(bestMove, score, pv, resultDepth, sum(result[3] for result in results),
+            (time.perf_counter() - startTime) * 1000)
+
+    """
+    Replays the move IDs of a principal variation on gs to turn them back into Move objects
+    """
+    def movesFromIDs(self, gs, moveIDs):
+        pv = []
+        for moveID in moveIDs:
+            move = next((move for move in gs.getValidMoves() if move.moveID == moveID), None)
+            if move is None:
+                break
+            gs.makeMove(move)
+            pv.append(move)
+        for move in pv:
+            gs.undoMove()
+        return pv
+
+    """
+    Empties the shared transposition table, for a new game. Call it between searches.
+    """
+    def clear(self):
+        self.memory.buf[:len(self.memory.buf)] = bytes(len(self.memory.buf))
+        self.generation = 0
+
+    def close(self):
+        self.pool.shutdown()
+        self.memory.close()
+        self.memory.unlink()
+
+
+"""
+One parallel search with a pool that is started and stopped around it
+"""
+def search(gs, workers=None, max_time_ms=None, max_nodes=None, depth=None, hashMb=ChessTransposition.DEFAULT_SIZE_MB):
+    parallel = ParallelSearch(workers, hashMb)
+    try:
+        return parallel.search(gs, max_time_ms, max_nodes, depth)
+    finally:
+        parallel.close()
@@ -0,0 +1,103 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth. The counts of well known positions are
+published, so comparing against them checks the move generator, and timing the count measures its speed.
+
+    python ChessPerft.py 4             count the start position to depth 4
+    python ChessPerft.py 4 --divide    count per root move
+    python ChessPerft.py --suite 4     check every reference position up to depth 4
+    python ChessPerft.py 3 --fen "..."  count another position
+"""
+
+import argparse
+import sys
+import time
+
+import ChessEngine
+
+#(name, FEN, expected counts for depth 1, 2, 3...)
+REFERENCE_POSITIONS = [
+    ("start position", ChessEngine.START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890, 3894594]),
+]
+
+"""
+Number of leaf nodes depth plies below the position in gs. gs is left as it was.
+"""
+def perft(gs, depth):
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1: #no need to make the last moves just to count them
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+"""
+Perft split by root move: a list of (move, nodes) so a wrong total can be tracked down to the move that is off
+"""
+def divide(gs, depth):
+    counts = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts.append((move, perft(gs, depth - 1)))
+        gs.undoMove()
+    return counts
+
+"""
+Runs perft and returns (nodes, seconds, nodes per second)
+"""
+def timedPerft(gs, depth):
+    start = time.perf_counter()
+    nodes = perft(gs, depth)
+    seconds = time.perf_counter() - start
+    return nodes, seconds, nodes / seconds if seconds > 0 else 0.0
+
+"""
+Checks every reference position at every depth up to maxDepth. Prints one line per count and returns True if all matched.
+"""
+def runSuite(maxDepth, out=sys.stdout):
+    allPassed = True
+    for name, fen, expected in REFERENCE_POSITIONS:
+        for depth in range(1, min(maxDepth, len(expected)) + 1):
+            nodes, seconds, nps = timedPerft(ChessEngine.GameState(fen), depth)
+            passed = nodes == expected[depth - 1]
+            allPassed = allPassed and passed
+            print("%-20s depth %d %10d nodes %8.3f s %10.0f nodes/s %s" % (name, depth, nodes, seconds, nps,
+                "ok" if passed else "FAIL (expected %d)" % expected[depth - 1]), file=out)
+    return allPassed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count the leaf nodes of the move tree to a fixed depth.")
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--divide", action="store_true", help="print the count of every root move")
+    parser.add_argument("--suite", action="store_true", help="check the reference positions up to depth")
+    parser.add_argument("--fen", default=ChessEngine.START_FEN, help="position to count (default: the start position)")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 0 if runSuite(args.depth) else 1
+    gs = ChessEngine.GameState(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(gs, args.depth)
+        for move, nodes in counts:
+            print("%s: %d" % (move.getUCINotation(), nodes))
+        nodes = sum(nodes for move, nodes in counts)
+    else:
+        nodes = perft(gs, args.depth)
+    seconds = time.perf_counter() - start
+    print("depth %d: %d nodes in %.3f s (%.0f nodes/s)" % (args.depth, nodes, seconds, nodes / seconds if seconds > 0 else 0.0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Lookups tried before searching: the opening book first, then the endgame tablebases.
+When either one knows the position the move is played at once and the search is skipped.
+
+Tablebases plug in through the Tablebase hook: anything with a maxPieces number and a probe(gs) method will do.
+SyzygyTablebase reads local Syzygy files with the python-chess package when it is installed.
+Tablebase probes are slow (they read compressed files), so their results are kept in an LRU cache keyed by Zobrist key.
+"""
+
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 4096
+
+#win/draw/loss from the side to move's point of view, as Syzygy reports it
+LOSS = -2
+BLESSED_LOSS = -1 #lost, but drawn under the 50-move rule
+DRAW = 0
+CURSED_WIN = 1 #won, but drawn under the 50-move rule
+WIN = 2
+
+
+"""
+A dictionary of limited size: once it is full, the entry that was used least recently is dropped
+"""
+class LRUCache():
+    def __init__(self, maxSize=DEFAULT_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class Tablebase():
+    """
+    The hook for endgame tablebases. Positions with more than maxPieces pieces (kings included) are never probed.
+    probe returns (wdl, move) for positions it knows, wdl being one of LOSS...WIN for the side to move
+    and move the valid move of gs to play, or None for positions it does not know.
+    """
+    maxPieces = 0
+
+    def probe(self, gs):
+        return None
+
+    def close(self):
+        pass
+
+
+class SyzygyTablebase(Tablebase):
+    """
+    Syzygy tablebase files (.rtbw and .rtbz) in directory, read with python-chess
+    """
+    def __init__(self, directory, maxPieces=7):
+        try:
+            import chess
+            import chess.syzygy
+        except ImportError:
+            raise ImportError("Syzygy tablebases need the python-chess package")
+        self.chess = chess
+        self.tables = chess.syzygy.open_tablebase(directory)
+        self.maxPieces = maxPieces
+
+    """
+    Every valid move is made and the position after it probed. The move that leaves the opponent worst off wins:
+    when winning the one closest to the next capture or pawn move (dtz), when losing the one furthest from it.
+    """
+    def probe(self, gs):
+        board = self.chess.Board(gs.getFEN())
+        wdl = self.tables.get_wdl(board)
+        if wdl is None:
+            return None
+        bestMove = None
+        bestKey = None
+        for move in gs.getValidMoves():
+            gs.makeMove(move)
+            after = self.chess.Board(gs.getFEN())
+            gs.undoMove()
+            if after.is_checkmate():
+                return WIN, move
+            moveWdl = self.tables.get_wdl(after)
+            moveDtz = self.tables.get_dtz(after)
+            if moveWdl is None or moveDtz is None:
+                continue
+            #the opponent's result, negated, then prefer short wins and long losses
+            key = (-moveWdl, -abs(moveDtz) if moveWdl < 0 else abs(moveDtz))
+            if bestKey is None or key > bestKey:
+                bestKey, bestMove = key, move
+        if bestMove is None:
+            return None
+        return wdl, bestMove
+
+    def close(self):
+        self.tables.close()
+
+
+class ProbeLayer():
+    """
+    book is a ChessBook.PolyglotBook and tablebase a Tablebase, either may be None.
+    rng picks between book moves (the random module when None), bestBookMove always plays the heaviest one instead.
+    """
+    def __init__(self, book=None, tablebase=None, cacheSize=DEFAULT_CACHE_SIZE, rng=None, bestBookMove=False):
+        self.book = book
+        self.tablebase = tablebase
+        self.cache = LRUCache(cacheSize)
+        self.rng = rng
+        self.bestBookMove = bestBookMove
+
+    """
+    Returns (move, source) with source "book" or "tablebase", or None when the position has to be searched
+    """
+    def probe(self, gs):
+        if self.book is not None:
+            move = self.book.chooseMove(gs, self.rng, self.bestBookMove)
+            if move is not None:
+                return move, "book"
+        result = self.probeTablebase(gs)
+        if result is not None:
+            return result[1], "tablebase"
+        return None
+
+    """
+    (wdl, move) from the tablebase for gs, through the cache, or None
+    """
+    def probeTablebase(self, gs):
+        if self.tablebase is None or gs.board.occupied.bit_count() > self.tablebase.maxPieces:
+            return None
+        cached = self.cache.get(gs.zobristKey, False)
+        if cached is False:
+            result = self.tablebase.probe(gs)
+            #the move is kept as its ID, Move objects belong to the GameState they were generated in
+            cached = (result[0], result[1].moveID) if result is not None else None
+            self.cache.put(gs.zobristKey, cached)
+        if cached is None:
+            return None
+        wdl, moveID = cached
+        for move in gs.getValidMoves():
+            if move.moveID == moveID:
+                return wdl, move
+        return None
+
+    def close(self):
+        if self.book is not None:
+            self.book.close()
+        if self.tablebase is not None:
+            self.tablebase.close()
@@ -0,0 +1,283 @@
+"""
+Finds the best move for the side to move in a GameState.
+Negamax alpha-beta search with iterative deepening and a quiescence search on captures.
+The search can be bounded by depth, time and number of nodes; when a budget runs out it returns the result
+of the deepest iteration that finished, so a best move is available even with a very tight budget.
+"""
+
+import time
+
+import ChessEval
+import ChessMoveOrder
+import ChessStats
+import ChessTransposition
+
+CHECKMATE = 30000 #mate scores are CHECKMATE - ply, so a quicker mate scores higher
+STALEMATE = 0
+DEPTH = 3 #depth searched when no budget is given
+MAX_DEPTH = 64
+CHECK_EVERY = 256 #how many nodes are searched between looking at the clock
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+"""
+What a search found: the best move, its score from the point of view of the side to move (in centipawns),
+the principal variation (the line both sides are expected to play), the depth it was searched to and the nodes searched.
+"""
+class SearchResult():
+    def __init__(self, bestMove, score, pv, depth, nodes, timeMs):
+        self.bestMove = bestMove
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+        self.timeMs = timeMs
+
+
+"""
+True if the position after the last move already came up earlier in the game with the same side to move.
+Only the positions since the last capture or pawn move can repeat, so the scan stops at the halfmove clock.
+"""
+def isRepetition(gs):
+    last = len(gs.moveLog)
+    for i in range(last - 2, max(last - gs.halfmoveClock, 0) - 1, -2): #positions with the same side to move
+        if gs.moveLog[i].zobristKey == gs.zobristKey:
+            return True
+    return False
+
+
+"""
+Mate scores are stored in the transposition table as distance to mate from the stored position, not from the root,
+so they stay right when the position is reached again at another ply
+"""
+def scoreToTT(score, ply):
+    if score >= CHECKMATE - MAX_DEPTH:
+        return score + ply
+    if score <= -CHECKMATE + MAX_DEPTH:
+        return score - ply
+    return score
+
+def scoreFromTT(score, ply):
+    if score >= CHECKMATE - MAX_DEPTH:
+        return score - ply
+    if score <= -CHECKMATE + MAX_DEPTH:
+        return score + ply
+    return score
+
+
+class Searcher():
+    """
+    stopEvent is anything with an is_set() method (a threading or multiprocessing Event): once it is set the search stops
+    as if its time had run out
+    """
+    def __init__(self, gs, maxTimeMs=None, maxNodes=None, tt=None, stopEvent=None):
+        self.gs = gs
+        self.stopEvent = stopEvent
+        self.tt = tt if tt is not None else ChessTransposition.TranspositionTable()
+        self.maxNodes = maxNodes
+        self.startTime = time.perf_counter()
+        self.deadline = self.startTime + maxTimeMs / 1000 if maxTimeMs is not None else None
+        self.nodes = 0
+        self.pvMove = None #best move of the previous iteration, searched first at the root
+        self.onIteration = None #called with the SearchResult of every finished iteration, for progress reports
+        self.orderer = ChessMoveOrder.MoveOrderer() #killers and history, learned over all the iterations of this search
+        self.evaluate = ChessEval.evaluate
+
+    """
+    Counts a node and stops the search once the node or time budget is spent or it was told to stop
+    """
+    def countNode(self):
+        self.nodes += 1
+        if self.maxNodes is not None and self.nodes >= self.maxNodes:
+            raise SearchTimeout()
+        if self.nodes % CHECK_EVERY == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stopEvent is not None and self.stopEvent.is_set():
+                raise SearchTimeout()
+
+    """
+    Negamax with alpha-beta pruning. Returns the score of the position for the side to move and the principal variation.
+    """
+    def negamax(self, depth, alpha, beta, ply):
+        self.countNode()
+        gs = self.gs
+        if ply > 0 and (gs.halfmoveClock >= 100 or isRepetition(gs)): #50-move rule or repetition
+            return STALEMATE, []
+        if depth <= 0:
+            return self.quiescence(alpha, beta, ply), []
+        alphaOrig = alpha
+        hashMoveID = None
+        entry = self.tt.probe(gs.zobristKey)
+        if entry is not None:
+            entryDepth, bound, score, hashMoveID = entry
+            if ply > 0 and entryDepth >= depth: #the stored result is deep enough to be used instead of searching
+                score = scoreFromTT(score, ply)
+                if bound == ChessTransposition.EXACT or \
+                    (bound == ChessTransposition.LOWER and score >= beta) or \
+                    (bound == ChessTransposition.UPPER and score <= alpha):
+                    return score, []
+        if ply == 0 and self.pvMove is not None:
+            hashMoveID = self.pvMove.moveID
+        moves = gs.getValidMoves()
+        if len(moves) == 0:
+            return (-CHECKMATE + ply if gs.checkMate else STALEMATE), []
+        bestPv = []
+        bestMove = None
+        for move in self.orderer.orderedMoves(moves, hashMoveID, ply, gs):
+            gs.makeMove(move)
+            try:
+                score, pv = self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                gs.undoMove() #the board has to be put back even when the search is stopped
+            score = -score
+            if score > alpha:
+                alpha = score
+                bestPv = [move] + pv
+                bestMove = move
+                if alpha >= beta:
+                    if move.pieceCaptured == "--" and not move.isPawnPromotion: #captures are already ordered first
+                        self.orderer.recordCutoff(move, depth, ply)
+                    break
+        if alpha >= beta:
+            bound = ChessTransposition.LOWER
+        elif alpha > alphaOrig:
+            bound = ChessTransposition.EXACT
+        else:
+            bound = ChessTransposition.UPPER
+        self.tt.store(gs.zobristKey, depth, bound, scoreToTT(alpha, ply), bestMove.moveID if bestMove is not None else hashMoveID)
+        return alpha, bestPv
+
+    """
+    Only captures are searched until the position is quiet, so the search never stops in the middle of an exchange.
+    The side to move can always stand pat, which means decline to capture and take the static score.
+    """
+    def quiescence(self, alpha, beta, ply):
+        self.countNode()
+        gs = self.gs
+        moves = gs.getValidMoves()
+        if len(moves) == 0:
+            return -CHECKMATE + ply if gs.checkMate else STALEMATE
+        if len(gs.checks) > 0: #in check there is no standing pat, every way out of the check is searched
+            candidates = moves
+        else:
+            standPat = self.evaluate(gs)
+            if standPat >= beta:
+                return standPat
+            alpha = max(alpha, standPat)
+            #captures that lose material in the exchange are not worth looking at
+            candidates = [move for move in moves if move.pieceCaptured != "--" and
+                (ChessMoveOrder.isSafeCapture(move) or gs.seeGE(move))]
+        for move in self.orderer.orderCaptures(candidates):
+            gs.makeMove(move)
+            try:
+                score = -self.quiescence(-beta, -alpha, ply + 1)
+            finally:
+                gs.undoMove()
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+    """
+    Iterative deepening: search depth 1, 2, 3... until the depth or a budget is reached.
+    Each iteration starts with the best move of the previous one, which makes the cutoffs come sooner.
+    """
+    def iterativeDeepening(self, maxDepth, startDepth=1):
+        self.tt.newSearch()
+        result = None
+        for depth in range(min(startDepth, maxDepth), maxDepth + 1):
+            try:
+                score, pv = self.negamax(depth, -CHECKMATE - 1, CHECKMATE + 1, 0)
+            except SearchTimeout:
+                break
+            self.pvMove = pv[0] if pv else None
+            result = SearchResult(self.pvMove, score, pv, depth, self.nodes, self.elapsedMs())
+            if self.onIteration is not None:
+                self.onIteration(result)
+            if abs(score) >= CHECKMATE - MAX_DEPTH: #found a forced mate, searching deeper will not change it
+                break
+        if result is None: #not even depth 1 finished, fall back to any legal move
+            moves = self.gs.getValidMoves()
+            bestMove = moves[0] if moves else None
+            result = SearchResult(bestMove, 0, [bestMove] if bestMove else [], 0, self.nodes, self.elapsedMs())
+        result.nodes = self.nodes
+        result.timeMs = self.elapsedMs()
+        return result
+
+    def elapsedMs(self):
+        return (time.perf_counter() - self.startTime) * 1000
+
+
+class InstrumentedSearcher(Searcher):
+    """
+    A Searcher that fills in a ChessStats.SearchStats as it goes. The counting and timing wrap the plain Searcher's methods,
+    so the plain Searcher runs none of it.
+    """
+    def __init__(self, gs, maxTimeMs=None, maxNodes=None, tt=None, stopEvent=None, stats=None):
+        super().__init__(gs, maxTimeMs, maxNodes, tt, stopEvent)
+        self.stats = stats if stats is not None else ChessStats.SearchStats()
+        self.tt = ChessStats.CountingTable(self.tt, self.stats)
+        self.orderer = ChessStats.TimedMoveOrderer(self.stats)
+        self.evaluate = ChessStats.timed(ChessEval.evaluate, self.stats, "evaluate")
+
+    def countNode(self):
+        try:
+            Searcher.countNode(self)
+        except SearchTimeout:
+            self.stats.stopped = True
+            raise
+
+    def negamax(self, depth, alpha, beta, ply):
+        result = Searcher.negamax(self, depth, alpha, beta, ply)
+        if ply == 0: #an iteration finished
+            self.stats.iterations.append((depth, self.nodes))
+        return result
+
+    def quiescence(self, alpha, beta, ply):
+        self.stats.qnodes += 1
+        return Searcher.quiescence(self, alpha, beta, ply)
+
+    """
+    Times the move generator for the length of the search, through wrappers set on the GameState itself,
+    which getValidMoves then also calls getAllPossibleMoves through
+    """
+    def iterativeDeepening(self, maxDepth, startDepth=1):
+        gs = self.gs
+        gs.getAllPossibleMoves = ChessStats.timed(gs.getAllPossibleMoves, self.stats, "getAllPossibleMoves")
+        gs.getValidMoves = ChessStats.timed(gs.getValidMoves, self.stats, "getValidMoves")
+        try:
+            result = Searcher.iterativeDeepening(self, maxDepth, startDepth)
+        finally:
+            del gs.getAllPossibleMoves #back to the methods of the class
+            del gs.getValidMoves
+        self.stats.nodes = self.nodes
+        self.stats.seconds = result.timeMs / 1000
+        return result
+
+
+"""
+Searches the position in gs and returns a SearchResult. gs is left as it was.
+max_time_ms and max_nodes bound the search, depth caps the iterative deepening.
+With no budget at all the search goes to DEPTH.
+Pass the same TranspositionTable as tt to keep what was learned from one search to the next.
+Setting stop_event (a threading Event) stops the search early, like a spent budget.
+Passing a ChessStats.SearchStats as stats searches with an InstrumentedSearcher, which fills it in.
+"""
+def search(gs, max_time_ms=None, max_nodes=None, depth=None, tt=None, stop_event=None, stats=None):
+    if depth is None:
+        depth = DEPTH if max_time_ms is None and max_nodes is None else MAX_DEPTH
+    searcher = makeSearcher(gs, max_time_ms, max_nodes, tt, stop_event, stats)
+    return searcher.iterativeDeepening(depth)
+
+"""
+A Searcher, or an InstrumentedSearcher when stats is given: the choice is made once here and not at every node
+"""
+def makeSearcher(gs, maxTimeMs=None, maxNodes=None, tt=None, stopEvent=None, stats=None):
+    if stats is None:
+        return Searcher(gs, maxTimeMs, maxNodes, tt, stopEvent)
+    return InstrumentedSearcher(gs, maxTimeMs, maxNodes, tt, stopEvent, stats)
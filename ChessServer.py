@@ -0,0 +1,383 @@
+"""
+Analysis server: positions are sent to the engine over a local socket instead of starting a process for every query.
+
+    python -m ChessServer --port 7654 --workers 4
+
+The protocol is one JSON object per line, both ways. A request is
+    {"id": 1, "fen": "...", "depth": 6}            (or "movetime" in milliseconds, or "nodes", any mix of them)
+and may also give "timeout" in seconds, counted from when the request is read (so waiting for a free worker counts too),
+after which the answer is an error instead of a result. The answer is
+    {"id": 1, "bestmove": "e2e4", "score": 35, "pv": ["e2e4", ...], "depth": 6, "nodes": 12345, "timeMs": 210, "cached": false}
+or {"id": 1, "error": "..."}. A line holding a JSON list of requests is a batch, answered with one list in the same order.
+{"cmd": "stats"} answers with the server counters. Answers to single requests come back as they are ready, not in order,
+so every request should have its own id.
+
+The searches run in a pool of worker processes, started and warmed up (imports made, tables built, one short search run)
+before the server takes connections. Every worker keeps its own transposition table from one search to the next.
+Identical requests (same position hash and budget) share one search while it runs, and finished results are kept in an
+LRU cache, so a repeated position is answered without searching. When maxPending searches are queued or running the
+server stops reading new requests until one finishes, which pushes back on the clients through their sockets.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import ChessEngine
+import ChessProbe
+import ChessSearch
+import ChessTransposition
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7654
+DEFAULT_CACHE_SIZE = 65536 #results kept
+MAX_PENDING_PER_WORKER = 8 #searches queued or running per worker before the server stops reading requests
+MAX_LINE = 1 << 20 #longest request line, in bytes
+WARM_UP_DEPTH = 2
+
+#set up in every worker process by initWorker
+workerTT = None
+workerStop = None
+
+
+"""
+Runs once in every worker process as it starts: makes its transposition table and warms it up with a short search,
+so the first real request does not pay for the imports and table setup
+"""
+def initWorker(hashMb, stopEvent):
+    global workerTT, workerStop
+    workerStop = stopEvent #set when the server closes, running searches then stop at once
+    workerTT = ChessTransposition.TranspositionTable(hashMb)
+    ChessSearch.search(ChessEngine.GameState(), depth=WARM_UP_DEPTH, tt=workerTT)
+    workerTT.clear()
+
+def warmUp(seconds):
+    time.sleep(seconds) #keeps this worker busy, so the other warm up calls start the other workers
+    return multiprocessing.current_process().pid
+
+"""
+Searches one position in a worker. The answer is sent back as plain values, Move objects stay in the worker.
+"""
+def analyseWorker(fen, depth, maxTimeMs, maxNodes):
+    result = ChessSearch.search(ChessEngine.GameState(fen), max_time_ms=maxTimeMs, max_nodes=maxNodes, depth=depth, tt=workerTT,
+        stop_event=workerStop)
+    return {
+        "bestmove": result.bestMove.getUCINotation() if result.bestMove is not None else None,
+        "score": result.score,
+        "pv": [move.getUCINotation() for move in result.pv],
+        "depth": result.depth,
+        "nodes": result.nodes,
+        "timeMs": int(result.timeMs),
+    }
+
+
+"""
+Reads the search budget of a request: (depth, movetime, nodes). Raises ValueError for a bad one.
+"""
+def readBudget(request):
+    budget = []
+    for name in ("depth", "movetime", "nodes"):
+        value = request.get(name)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+            raise ValueError("%s must be a positive whole number" % name)
+        budget.append(value)
+    depth, movetime, nodes = budget
+    if depth is not None and depth > ChessSearch.MAX_DEPTH:
+        raise ValueError("depth can be at most %d" % ChessSearch.MAX_DEPTH)
+    if depth is None and movetime is None and nodes is None:
+        depth = ChessSearch.DEPTH
+    return depth, movetime, nodes
+
+
+class AnalysisServer():
+    """
+    workers is the number of worker processes (all the cores when None), hashMb the transposition table size of each one.
+    timeout is the default for requests that do not give one, in seconds, None for no limit.
+    """
+    def __init__(self, workers=None, hashMb=ChessTransposition.DEFAULT_SIZE_MB, cacheSize=DEFAULT_CACHE_SIZE,
+            maxPending=None, timeout=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.hashMb = hashMb
+        self.cache = ChessProbe.LRUCache(cacheSize)
+        self.maxPending = maxPending or self.workers * MAX_PENDING_PER_WORKER
+        self.timeout = timeout
+        self.pool = None
+        self.restarting = None #task starting a new pool after a worker died, requests wait for it
+        self.stopEvent = multiprocessing.Event()
+        self.slots = None #asyncio.Semaphore of maxPending, made in start() on the running loop
+        self.inFlight = {} #request key -> asyncio Future of the running search
+        self.server = None
+        self.clients = {} #connection handler task -> its writer, so close() can end them
+        self.requests = 0
+        self.searches = 0
+        self.deduplicated = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.restarts = 0
+        self.startTime = time.perf_counter()
+
+    """
+    Starts the worker processes and waits until all of them are warmed up
+    """
+    async def startWorkers(self):
+        self.slots = asyncio.Semaphore(self.maxPending)
+        await self.startPool()
+
+    async def startPool(self):
+        loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=initWorker, initargs=(self.hashMb, self.stopEvent))
+        await asyncio.gather(*[loop.run_in_executor(self.pool, warmUp, 0.2) for i in range(self.workers)])
+
+    """
+    A worker process died, which breaks the whole pool: a new one is started and warmed up, once however many
+    requests find out. The searches of the old pool have already failed.
+    """
+    def restartPool(self):
+        if self.restarting is not None and not self.restarting.done():
+            return
+        self.restarts += 1
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        self.restarting = asyncio.ensure_future(self.startPool())
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        await self.startWorkers()
+        self.server = await asyncio.start_server(self.handleClient, host, port, limit=MAX_LINE)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in self.clients.values(): #the handlers see the end of their connection and finish
+                writer.close()
+            await asyncio.gather(*self.clients, return_exceptions=True)
+            await self.server.wait_closed()
+        if self.restarting is not None:
+            await asyncio.gather(self.restarting, return_exceptions=True)
+        if self.pool is not None:
+            self.stopEvent.set()
+            self.pool.shutdown(cancel_futures=True)
+
+    """
+    Answers the requests of one connection. A request that needs a new search waits for a free slot before
+    the next line is read, that is where the backpressure comes from.
+    """
+    async def handleClient(self, reader, writer):
+        writeLock = asyncio.Lock()
+        tasks = set()
+        async def send(answer):
+            async with writeLock:
+                writer.write(json.dumps(answer).encode() + b"\n")
+                await writer.drain()
+        async def reply(answers, batch):
+            results = await asyncio.gather(*answers)
+            await send(results if batch else results[0])
+        handler = asyncio.current_task()
+        self.clients[handler] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    await send({"error": "request line too long"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    self.errors += 1
+                    await send({"error": "not JSON"})
+                    continue
+                received = asyncio.get_running_loop().time()
+                batch = isinstance(message, list)
+                answers = []
+                for request in (message if batch else [message]):
+                    try:
+                        answers.append(await self.submit(request, received))
+                    except Exception as error: #one bad request does not end the connection
+                        self.errors += 1
+                        requestID = request.get("id") if isinstance(request, dict) else None
+                        answers.append(ready({"id": requestID, "error": "internal error: %s" % error}))
+                task = asyncio.ensure_future(reply(answers, batch))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            del self.clients[handler]
+            writer.close()
+
+    """
+    Starts answering one request. Returns an awaitable of its answer: cached results and errors are ready at once,
+    the others wait for their search. received is when the request was read (event loop clock): its timeout runs from then,
+    so the time spent waiting for a free slot counts as well.
+    """
+    async def submit(self, request, received=None):
+        if received is None:
+            received = asyncio.get_running_loop().time()
+        self.requests += 1
+        if not isinstance(request, dict):
+            self.errors += 1
+            return ready({"error": "a request must be a JSON object"})
+        requestID = request.get("id")
+        if request.get("cmd") == "stats":
+            return ready(dict(self.statistics(), id=requestID))
+        try:
+            fen = request["fen"] if "fen" in request else ChessEngine.START_FEN
+            if not isinstance(fen, str):
+                raise ValueError("fen must be a string")
+            gs = ChessEngine.GameState(fen)
+            depth, movetime, nodes = readBudget(request)
+            timeout = request.get("timeout", self.timeout)
+            if timeout is not None and (not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0):
+                raise ValueError("timeout must be a positive number of seconds")
+            deadline = received + timeout if timeout is not None else None
+        except ValueError as error:
+            self.errors += 1
+            return ready({"id": requestID, "error": str(error)})
+
+        #the clocks are part of the key, the 50-move rule can change the result
+        key = (gs.zobristKey, gs.halfmoveClock, depth, movetime, nodes)
+        result = self.cache.get(key)
+        if result is not None:
+            return ready(dict(result, id=requestID, cached=True))
+        future = self.inFlight.get(key)
+        if future is None:
+            try:
+                await asyncio.wait_for(self.slots.acquire(), self.remaining(deadline))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return ready({"id": requestID, "error": "timeout"})
+            future = self.inFlight.get(key) #the same search may have been started while this one waited
+            if future is not None:
+                self.slots.release()
+        if future is not None:
+            self.deduplicated += 1
+        else:
+            try:
+                if self.restarting is not None:
+                    await asyncio.shield(self.restarting)
+                future = asyncio.get_running_loop().run_in_executor(self.pool, analyseWorker, gs.getFEN(), depth, movetime, nodes)
+            except Exception as error:
+                self.slots.release()
+                self.errors += 1
+                if isinstance(error, BrokenProcessPool):
+                    self.restartPool()
+                return ready({"id": requestID, "error": "search failed: %s" % (str(error) or type(error).__name__)})
+            self.inFlight[key] = future
+            self.searches += 1
+            future.add_done_callback(lambda future: self.searchDone(key, future))
+        return self.wait(future, requestID, deadline)
+
+    """
+    Seconds left until deadline (a time of the event loop clock), None when there is no deadline
+    """
+    def remaining(self, deadline):
+        if deadline is None:
+            return None
+        return max(0.0, deadline - asyncio.get_running_loop().time())
+
+    def searchDone(self, key, future):
+        self.slots.release()
+        del self.inFlight[key]
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            self.cache.put(key, future.result())
+        elif isinstance(future.exception(), BrokenProcessPool):
+            self.restartPool()
+
+    """
+    The answer of a request once its search is done. A request that times out leaves the search running,
+    for the other requests waiting on it and for the cache.
+    """
+    async def wait(self, future, requestID, deadline):
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.remaining(deadline))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return {"id": requestID, "error": "timeout"}
+        except Exception as error:
+            self.errors += 1
+            return {"id": requestID, "error": "search failed: %s" % error}
+        return dict(result, id=requestID, cached=False)
+
+    def statistics(self):
+        seconds = time.perf_counter() - self.startTime
+        return {
+            "workers": self.workers,
+            "requests": self.requests,
+            "searches": self.searches,
+            "searchesPerSecond": round(self.searches / seconds, 2) if seconds > 0 else 0.0,
+            "inFlight": len(self.inFlight),
+            "deduplicated": self.deduplicated,
+            "cacheSize": len(self.cache),
+            "cacheHits": self.cache.hits,
+            "cacheMisses": self.cache.misses,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "restarts": self.restarts,
+        }
+
+
+"""
+An awaitable that is done at once, for answers that need no search
+"""
+async def ready(answer):
+    return answer
+
+
+"""
+Sends the requests to a running server on one connection and returns the answers in the order of the requests
+"""
+async def analyse(requests, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+    try:
+        writer.write(json.dumps(list(requests)).encode() + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def serve(args):
+    server = AnalysisServer(args.workers, args.hash, args.cache, args.max_pending, args.timeout)
+    await server.start(args.host, args.port)
+    print("analysis server on %s:%d with %d workers" % (args.host, args.port, server.workers), flush=True)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse positions sent as JSON lines over a local socket.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--hash", type=int, default=ChessTransposition.DEFAULT_SIZE_MB, help="transposition table MB per worker")
+    parser.add_argument("--cache", type=int, default=DEFAULT_CACHE_SIZE, help="results kept in the cache")
+    parser.add_argument("--max-pending", type=int, default=None, help="searches queued or running before reading pauses")
+    parser.add_argument("--timeout", type=float, default=None, help="default request timeout in seconds")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Search statistics, for finding out where the nodes and the time of a search go:
+nodes and quiescence nodes, transposition table hits, beta cutoffs and how often the first move caused them,
+the effective branching factor of every iteration, and the time spent generating moves, evaluating and ordering.
+
+They are collected by ChessSearch.InstrumentedSearcher, which is only used when a SearchStats is passed to the search.
+The plain Searcher has none of this code in it, so a search without statistics does not pay for them.
+The results come out as JSON (toJSON) or as UCI info lines (uciInfo).
+"""
+
+import json
+import time
+
+import ChessMoveOrder
+
+#timed phases. getValidMoves includes the getAllPossibleMoves it calls, ordering includes the static exchange evaluations.
+PHASES = ("getAllPossibleMoves", "getValidMoves", "evaluate", "ordering")
+
+
+class SearchStats():
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0 #every node, quiescence nodes included
+        self.qnodes = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.cutoffs = 0 #beta cutoffs in the main search
+        self.firstMoveCutoffs = 0 #cutoffs by the first move searched, a measure of the move ordering
+        self.iterations = [] #(depth, nodes searched so far) at the end of every finished iteration
+        self.phaseTimes = dict.fromkeys(PHASES, 0.0)
+        self.phaseCalls = dict.fromkeys(PHASES, 0)
+        self.seconds = 0.0
+        self.stopped = False #set once the budget ran out, the unwinding that follows is not counted as cutoffs
+
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    """
+    (depth, effective branching factor) for every iteration after the first: its nodes divided by the nodes of the one before
+    """
+    def branchingFactors(self):
+        factors = []
+        previous = None
+        for i, (depth, nodes) in enumerate(self.iterations):
+            iterationNodes = nodes - (self.iterations[i - 1][1] if i > 0 else 0)
+            if previous:
+                factors.append((depth, iterationNodes / previous))
+            previous = iterationNodes
+        return factors
+
+    def toDict(self):
+        return {
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "nps": int(self.nodes / self.seconds) if self.seconds > 0 else 0,
+            "timeMs": int(self.seconds * 1000),
+            "ttProbes": self.ttProbes,
+            "ttHits": self.ttHits,
+            "cutoffs": self.cutoffs,
+            "firstMoveCutoffRate": round(self.firstMoveCutoffRate(), 4),
+            "branchingFactor": {str(depth): round(factor, 3) for depth, factor in self.branchingFactors()},
+            "phaseMs": {phase: round(seconds * 1000, 3) for phase, seconds in self.phaseTimes.items()},
+            "phaseCalls": dict(self.phaseCalls),
+        }
+
+    def toJSON(self):
+        return json.dumps(self.toDict())
+
+    """
+    The statistics as UCI "info string" lines, one line of name value pairs for the counters and one for the timers
+    """
+    def uciInfo(self):
+        stats = self.toDict()
+        counters = " ".join("%s %s" % (name, stats[name]) for name in
+            ("nodes", "qnodes", "nps", "timeMs", "ttProbes", "ttHits", "cutoffs", "firstMoveCutoffRate"))
+        branching = " ".join("%s %s" % item for item in stats["branchingFactor"].items())
+        timers = " ".join("%s %s" % item for item in stats["phaseMs"].items())
+        return ["info string stats %s" % counters,
+                "info string stats branchingFactor %s" % (branching or "-"),
+                "info string stats phaseMs %s" % timers]
+
+
+"""
+Wraps function so that every call is counted and timed under phase in stats
+"""
+def timed(function, stats, phase):
+    phaseTimes = stats.phaseTimes
+    phaseCalls = stats.phaseCalls
+    def timedFunction(*args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            phaseTimes[phase] += time.perf_counter() - start
+            phaseCalls[phase] += 1
+    return timedFunction
+
+
+"""
+A transposition table that counts its probes and hits and passes everything on to the real one
+"""
+class CountingTable():
+    def __init__(self, tt, stats):
+        self.tt = tt
+        self.stats = stats
+
+    def probe(self, key):
+        self.stats.ttProbes += 1
+        entry = self.tt.probe(key)
+        if entry is not None:
+            self.stats.ttHits += 1
+        return entry
+
+    def __getattr__(self, name):
+        return getattr(self.tt, name)
+
+
+"""
+A MoveOrderer that times the ordering and counts cutoffs. The search stops taking moves from orderedMoves only when
+a move caused a cutoff, so a stage generator closed before it ran out is a cutoff, after as many moves as it handed out.
+"""
+class TimedMoveOrderer(ChessMoveOrder.MoveOrderer):
+    def __init__(self, stats):
+        super().__init__()
+        self.stats = stats
+
+    def orderedMoves(self, moves, hashMoveID=None, ply=0, gs=None):
+        stats = self.stats
+        stats.phaseCalls["ordering"] += 1
+        stages = super().orderedMoves(moves, hashMoveID, ply, gs)
+        handedOut = 0
+        exhausted = False
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    move = next(stages)
+                except StopIteration:
+                    exhausted = True
+                    return
+                finally:
+                    stats.phaseTimes["ordering"] += time.perf_counter() - start
+                handedOut += 1
+                yield move
+        finally:
+            if not exhausted and not stats.stopped:
+                stats.cutoffs += 1
+                if handedOut == 1:
+                    stats.firstMoveCutoffs += 1
+
+    def orderCaptures(self, moves):
+        start = time.perf_counter()
+        ordered = super().orderCaptures(moves)
+        self.stats.phaseTimes["ordering"] += time.perf_counter() - start
+        self.stats.phaseCalls["ordering"] += 1
+        return ordered
@@ -0,0 +1,102 @@
+"""
+Attack tables used by move generation. Everything here is built once when the module is imported,
+so the move generators only have to look squares up instead of redoing offsets, bounds checks and ray walks.
+Squares are numbered row * 8 + col like in ChessBitboard, so row 0 is the 8th rank.
+"""
+
+import random
+
+import ChessBitboard
+
+KNIGHT_OFFSETS = ((2,1),(2,-1),(1,2),(1,-2),(-1,2),(-1,-2),(-2,1),(-2,-1))
+KING_OFFSETS = ((1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1))
+
+#the 8 sliding directions as (row step, col step), first 4 are orthogonal and the next 4 are diagonal
+DIRECTIONS = ((-1,0), (0,-1), (1,0), (0,1), (-1,-1), (-1,1), (1,-1), (1,1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+#a ray goes towards higher square numbers when it moves down the board, or right along a row
+POSITIVE_DIRECTIONS = tuple(d[0] * 8 + d[1] > 0 for d in DIRECTIONS)
+
+"""
+For every square, the set of squares reached by taking one step of each offset (knights, kings and pawn captures)
+"""
+def buildStepTable(offsets):
+    table = []
+    for sq in range(64):
+        row, col = sq >> 3, sq & 7
+        attacks = 0
+        for dRow, dCol in offsets:
+            endRow, endCol = row + dRow, col + dCol
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                attacks |= 1 << (endRow * 8 + endCol)
+        table.append(attacks)
+    return table
+
+"""
+For every square, all the squares from there to the edge of the board in one direction (the square itself not included)
+"""
+def buildRayTable(direction):
+    table = []
+    for sq in range(64):
+        ray = 0
+        endRow, endCol = (sq >> 3) + direction[0], (sq & 7) + direction[1]
+        while 0 <= endRow < 8 and 0 <= endCol < 8:
+            ray |= 1 << (endRow * 8 + endCol)
+            endRow, endCol = endRow + direction[0], endCol + direction[1]
+        table.append(ray)
+    return table
+
+KNIGHT_ATTACKS = buildStepTable(KNIGHT_OFFSETS)
+KING_ATTACKS = buildStepTable(KING_OFFSETS)
+#white pawns move up the board (towards row 0) and black pawns move down
+PAWN_ATTACKS = {"w": buildStepTable(((-1,-1), (-1,1))), "b": buildStepTable(((1,-1), (1,1)))}
+PAWN_PUSHES = {"w": buildStepTable(((-1,0),)), "b": buildStepTable(((1,0),))}
+#the two square advance, only from the starting row
+PAWN_DOUBLE_PUSHES = {
+    "w": [1 << (sq - 16) if sq >> 3 == 6 else 0 for sq in range(64)],
+    "b": [1 << (sq + 16) if sq >> 3 == 1 else 0 for sq in range(64)]}
+RAYS = [buildRayTable(d) for d in DIRECTIONS]
+
+"""
+Squares a slider on sq attacks along the given directions. Each ray is cut off behind its first blocker
+by removing the blocker's own ray in the same direction, so the blocker itself stays attacked.
+"""
+def slidingAttacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE_DIRECTIONS[d]:
+                blocker = (blockers & -blockers).bit_length() - 1 #nearest blocker is the lowest square
+            else:
+                blocker = blockers.bit_length() - 1 #nearest blocker is the highest square
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, ROOK_DIRECTIONS)
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, BISHOP_DIRECTIONS)
+
+def queenAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, range(8))
+
+#rook and bishop attacks on an empty board: a slider outside these lines can never reach the square, whatever is in between
+ROOK_LINES = [rookAttacks(sq, 0) for sq in range(64)]
+BISHOP_LINES = [bishopAttacks(sq, 0) for sq in range(64)]
+
+"""
+Zobrist keys: one random 64-bit number per piece per square, one for black to move, one per castling rights
+combination and one per en passant file. A position's key is the XOR of the numbers of everything in it,
+so a move only has to XOR out what changed and XOR in what is new.
+The generator is seeded so keys are the same in every process.
+"""
+zobristRandom = random.Random(0x5EED)
+ZOBRIST_PIECES = {piece: [zobristRandom.getrandbits(64) for sq in range(64)] for piece in ChessBitboard.PIECES}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [zobristRandom.getrandbits(64) for rights in range(16)]
+ZOBRIST_ENPASSANT = [zobristRandom.getrandbits(64) for col in range(8)]
@@ -0,0 +1,87 @@
+"""
+Fixed size transposition table: remembers what the search found out about positions it has already seen, keyed by Zobrist key.
+The whole table is one preallocated buffer of 64-bit words, so its memory use is set when it is created and never grows.
+
+Every bucket holds 2 entries of 2 words each:
+    word 0: the position's key XORed with word 1 (a half written entry then fails the key check instead of giving wrong data)
+    word 1: move ID (16 bits) | score + 32768 (16 bits) | depth (8 bits) | bound (2 bits) | generation (8 bits)
+The first entry of a bucket keeps the deepest result, the second entry is always replaced.
+"""
+
+MB = 1024 * 1024
+ENTRY_WORDS = 2
+BUCKET_ENTRIES = 2
+BUCKET_BYTES = ENTRY_WORDS * BUCKET_ENTRIES * 8
+DEFAULT_SIZE_MB = 16
+
+#what the score of an entry means
+EXACT = 0 #the real score
+LOWER = 1 #the score is at least this much (the search failed high)
+UPPER = 2 #the score is at most this much (the search failed low)
+
+SCORE_OFFSET = 32768
+MASK_16 = 0xFFFF
+
+
+class TranspositionTable():
+    """
+    sizeMb is the memory budget. A buffer (for example shared memory) can be passed in to hold the table instead,
+    its size then decides how many buckets there are.
+    """
+    def __init__(self, sizeMb=DEFAULT_SIZE_MB, buffer=None):
+        if buffer is None:
+            buffer = bytearray(max(1, int(sizeMb * MB) // BUCKET_BYTES) * BUCKET_BYTES)
+        self.buffer = buffer
+        self.numBuckets = len(buffer) // BUCKET_BYTES
+        self.words = memoryview(buffer)[:self.numBuckets * BUCKET_BYTES].cast("Q")
+        self.generation = 0 #which search the entries were written by, so old entries can be replaced first
+        self.probes = 0
+        self.hits = 0
+
+    """
+    Call before every new search: entries of earlier searches become the first ones to be replaced
+    """
+    def newSearch(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.words.cast("B")[:] = bytes(len(self.words) * 8)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    """
+    Returns (depth, bound, score, moveID) stored for the key, or None when the position is not in the table
+    """
+    def probe(self, key):
+        self.probes += 1
+        words = self.words
+        index = (key % self.numBuckets) * (ENTRY_WORDS * BUCKET_ENTRIES)
+        for slot in (index, index + ENTRY_WORDS):
+            data = words[slot + 1]
+            if words[slot] ^ data == key and data:
+                self.hits += 1
+                return (data >> 32) & 0xFF, (data >> 40) & 3, ((data >> 16) & MASK_16) - SCORE_OFFSET, data & MASK_16
+        return None
+
+    """
+    Stores a search result. The deep entry of the bucket is only replaced by a result that is at least as deep,
+    by the same position, or when it comes from an older search; anything else goes into the always replace entry.
+    """
+    def store(self, key, depth, bound, score, moveID):
+        words = self.words
+        index = (key % self.numBuckets) * (ENTRY_WORDS * BUCKET_ENTRIES)
+        data = ((moveID or 0) & MASK_16) | (score + SCORE_OFFSET) << 16 | min(depth, 0xFF) << 32 | bound << 40 | self.generation << 42
+        deep = words[index + 1]
+        if deep == 0 or words[index] ^ deep == key or (deep >> 42) != self.generation or depth >= (deep >> 32) & 0xFF:
+            slot = index
+        else:
+            slot = index + ENTRY_WORDS
+        words[slot] = key ^ data
+        words[slot + 1] = data
+
+    """
+    Fraction of probes that found their position
+    """
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
@@ -0,0 +1,324 @@
+"""
+Headless UCI (Universal Chess Interface) front-end, for running the engine under a GUI or a match orchestrator:
+
+    python -m ChessUCI
+
+Commands are read from stdin and answers written to stdout. Nothing here needs pygame or a display.
+"go" searches on a background thread, so "stop" and "isready" are answered while the engine is thinking.
+With OwnBook and a BookFile, or a SyzygyPath, positions the book or the tablebases know are answered without searching.
+"""
+
+import sys
+import threading
+
+import ChessEngine
+import ChessProbe
+import ChessSearch
+import ChessStats
+import ChessTransposition
+
+ENGINE_NAME = "myChessEngine"
+ENGINE_AUTHOR = "Acharyaniyam"
+MAX_HASH_MB = 4096
+MAX_THREADS = 64
+MOVE_OVERHEAD_MS = 30 #kept back from every move for the time it takes to send it
+DEFAULT_MOVES_TO_GO = 30 #moves the remaining time is spread over when the GUI does not say
+FALLBACK_MOVETIME_MS = 1000 #thinking time when a go command has a limit that can not be read
+
+
+"""
+Finds the valid move written in UCI notation (e2e4, e7e8q). Raises ValueError when there is none.
+"""
+def uciToMove(gs, text):
+    if len(text) < 4 or text[0] not in ChessEngine.Move.filesToCols or text[2] not in ChessEngine.Move.filesToCols or \
+        text[1] not in ChessEngine.Move.ranksToRows or text[3] not in ChessEngine.Move.ranksToRows:
+        raise ValueError("can not read the move %r" % text)
+    for move in gs.getValidMoves():
+        if move.getUCINotation() == text:
+            return move
+    raise ValueError("illegal move %r in %s" % (text, gs.getFEN()))
+
+"""
+How long to think about the move, in milliseconds, from the clock values of a go command
+"""
+def allocateTime(timeLeftMs, incrementMs=0, movesToGo=None):
+    movesToGo = movesToGo or DEFAULT_MOVES_TO_GO
+    budget = timeLeftMs / movesToGo + incrementMs * 0.8
+    budget = min(budget, timeLeftMs / 2) #never bet too much of the clock on one move
+    return max(1, int(budget - MOVE_OVERHEAD_MS))
+
+"""
+UCI score: centipawns, or moves to mate when the score is a forced mate
+"""
+def formatScore(score):
+    if abs(score) >= ChessSearch.CHECKMATE - ChessSearch.MAX_DEPTH:
+        plies = ChessSearch.CHECKMATE - abs(score)
+        return "mate %d" % ((plies + 1) // 2 if score > 0 else -((plies + 1) // 2))
+    return "cp %d" % score
+
+
+class UCIEngine():
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.outLock = threading.Lock() #the search thread writes too
+        self.gs = ChessEngine.GameState()
+        self.hashMb = ChessTransposition.DEFAULT_SIZE_MB
+        self.threads = 1
+        self.tt = None #made when it is first needed, so a Hash option sent after startup does not allocate twice
+        self.parallel = None
+        self.ownBook = False
+        self.bookFile = ""
+        self.syzygyPath = ""
+        self.statsOutput = "off" #off, info or json: search statistics sent after every search
+        self.probes = None #opened on the first go after the book or tablebase options change
+        self.stopEvent = threading.Event()
+        self.searchThread = None
+        self.ponderArgs = None #the go arguments of a ponder search, searched for real on ponderhit
+        self.discardBestMove = False #set while a ponder search is stopped by ponderhit, its bestmove is not sent
+
+    def send(self, line):
+        with self.outLock:
+            print(line, file=self.out, flush=True)
+
+    """
+    Handles one line of input. Returns False when the engine should quit.
+    """
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name %s" % ENGINE_NAME)
+            self.send("id author %s" % ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (ChessTransposition.DEFAULT_SIZE_MB, MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max %d" % MAX_THREADS)
+            self.send("option name OwnBook type check default false")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name SyzygyPath type string default <empty>")
+            self.send("option name Stats type combo default off var off var info var json")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stopSearch()
+            self.setOption(args)
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.gs = ChessEngine.GameState()
+            if self.tt is not None:
+                self.tt.clear()
+            if self.parallel is not None:
+                self.parallel.clear()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            self.stopSearch()
+            self.go(args)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "quit":
+            self.stopSearch()
+            if self.parallel is not None:
+                self.parallel.close()
+            if self.probes is not None:
+                self.probes.close()
+            return False
+        return True
+
+    def setOption(self, args):
+        #setoption name <name> value <value>
+        if "name" not in args:
+            return
+        nameEnd = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:nameEnd]).lower()
+        value = " ".join(args[nameEnd + 1:])
+        try:
+            if name == "hash":
+                self.hashMb = max(1, min(MAX_HASH_MB, int(value)))
+                self.tt = None
+            elif name == "threads":
+                self.threads = max(1, min(MAX_THREADS, int(value)))
+            elif name == "stats":
+                if value.lower() not in ("off", "info", "json"):
+                    raise ValueError(value)
+                self.statsOutput = value.lower()
+                return
+            elif name in ("ownbook", "bookfile", "syzygypath"):
+                if name == "ownbook":
+                    self.ownBook = value.lower() == "true"
+                elif name == "bookfile":
+                    self.bookFile = "" if value == "<empty>" else value
+                else:
+                    self.syzygyPath = "" if value == "<empty>" else value
+                if self.probes is not None:
+                    self.probes.close()
+                    self.probes = None
+                return
+            else:
+                return
+        except ValueError:
+            self.send("info string bad value %r for option %s" % (value, name))
+            return
+        if self.parallel is not None: #started again with the new settings on the next go
+            self.parallel.close()
+            self.parallel = None
+
+    def setPosition(self, args):
+        #position startpos [moves ...] or position fen <fen> [moves ...]
+        movesAt = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args and args[0] == "fen":
+                gs = ChessEngine.GameState(" ".join(args[1:movesAt]))
+            else:
+                gs = ChessEngine.GameState()
+            for text in args[movesAt + 1:]:
+                gs.makeMove(uciToMove(gs, text))
+        except ValueError as error:
+            self.send("info string %s" % error)
+            return
+        self.gs = gs
+
+    def go(self, args):
+        options = {}
+        badValue = False
+        i = 0
+        while i < len(args):
+            if args[i] in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes") and i + 1 < len(args):
+                try:
+                    options[args[i]] = int(args[i + 1])
+                except ValueError: #the GUI still waits for a bestmove, so the search goes on with a short default time instead
+                    self.send("info string bad value %r for go %s" % (args[i + 1], args[i]))
+                    badValue = True
+                i += 2
+            else: #infinite, ponder and anything unknown: search until stopped
+                i += 1
+        infinite = "infinite" in args or "ponder" in args #bestmove must wait for stop, so no instant book move
+        self.ponderArgs = [arg for arg in args if arg != "ponder"] if "ponder" in args else None
+        depth = options.get("depth")
+        maxNodes = options.get("nodes")
+        maxTimeMs = options.get("movetime")
+        timeLeft = options.get("wtime" if self.gs.whiteToMove else "btime")
+        if maxTimeMs is None and timeLeft is not None:
+            maxTimeMs = allocateTime(timeLeft, options.get("winc" if self.gs.whiteToMove else "binc", 0), options.get("movestogo"))
+        if maxTimeMs is None and badValue and not infinite:
+            maxTimeMs = FALLBACK_MOVETIME_MS
+        if depth is None:
+            depth = ChessSearch.MAX_DEPTH
+        self.stopEvent.clear()
+        self.searchThread = threading.Thread(target=self.search, args=(maxTimeMs, maxNodes, depth, infinite), daemon=True)
+        self.searchThread.start()
+
+    """
+    The move the engine pondered on was played: the ponder search makes way for a normal one with the same clock,
+    which starts with what the ponder search left in the transposition table
+    """
+    def ponderHit(self):
+        if self.ponderArgs is None:
+            return
+        args = self.ponderArgs
+        self.discardBestMove = True
+        self.stopSearch()
+        self.discardBestMove = False
+        self.go(args)
+
+    """
+    Runs on the search thread: searches the current position and reports the best move.
+    Whatever goes wrong, a bestmove is sent, so the GUI is never left waiting.
+    In infinite (and ponder) mode the bestmove is held back until the search is stopped, as UCI asks,
+    even when the search finished on its own (a forced mate or the maximum depth).
+    """
+    def search(self, maxTimeMs, maxNodes, depth, infinite=False):
+        try:
+            bestMove = self.searchPosition(maxTimeMs, maxNodes, depth, not infinite)
+        except Exception as error:
+            self.send("info string search failed: %s: %s" % (type(error).__name__, error))
+            bestMove = "0000"
+        if infinite:
+            self.stopEvent.wait()
+        if not self.discardBestMove:
+            self.send("bestmove %s" % bestMove)
+
+    """
+    Searches the current position and returns the best move in UCI notation
+    """
+    def searchPosition(self, maxTimeMs, maxNodes, depth, useProbes):
+        probes = self.getProbes() if useProbes else None
+        if probes is not None:
+            found = probes.probe(self.gs)
+            if found is not None:
+                move, source = found
+                self.send("info string %s move" % source)
+                return move.getUCINotation()
+        if self.threads > 1:
+            if self.parallel is None:
+                import ChessParallel #only loaded when more than one thread is asked for
+                self.parallel = ChessParallel.ParallelSearch(self.threads, self.hashMb)
+            stats = ChessStats.SearchStats() if self.statsOutput != "off" else None
+            result = self.parallel.search(self.gs, maxTimeMs, maxNodes, depth, stats)
+            self.sendInfo(result)
+        else:
+            if self.tt is None:
+                self.tt = ChessTransposition.TranspositionTable(self.hashMb)
+            stats = ChessStats.SearchStats() if self.statsOutput != "off" else None
+            searcher = ChessSearch.makeSearcher(self.gs, maxTimeMs, maxNodes, self.tt, self.stopEvent, stats)
+            searcher.onIteration = self.sendInfo
+            result = searcher.iterativeDeepening(depth)
+        if stats is not None: #with Threads above 1, the statistics of the main worker
+            for line in (stats.uciInfo() if self.statsOutput == "info" else ["info string stats " + stats.toJSON()]):
+                self.send(line)
+        return result.bestMove.getUCINotation() if result.bestMove is not None else "0000"
+
+    """
+    The ProbeLayer for the book and tablebase options, or None when neither is set. Files that can not be opened are reported and skipped.
+    """
+    def getProbes(self):
+        if self.probes is None and ((self.ownBook and self.bookFile) or self.syzygyPath):
+            book = tablebase = None
+            if self.ownBook and self.bookFile:
+                import ChessBook
+                try:
+                    book = ChessBook.PolyglotBook(self.bookFile)
+                except OSError as error:
+                    self.send("info string can not open book: %s" % error)
+            if self.syzygyPath:
+                try:
+                    tablebase = ChessProbe.SyzygyTablebase(self.syzygyPath)
+                except (ImportError, OSError) as error:
+                    self.send("info string can not open tablebases: %s" % error)
+            self.probes = ChessProbe.ProbeLayer(book, tablebase)
+        return self.probes
+
+    def sendInfo(self, result):
+        nps = int(result.nodes * 1000 / result.timeMs) if result.timeMs > 0 else 0
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" % (result.depth, formatScore(result.score),
+            result.nodes, nps, int(result.timeMs), " ".join(move.getUCINotation() for move in result.pv)))
+
+    """
+    Stops a running search and waits for it to send its bestmove
+    """
+    def stopSearch(self):
+        if self.searchThread is None:
+            return
+        while self.searchThread.is_alive():
+            self.stopEvent.set()
+            if self.parallel is not None:
+                self.parallel.stopEvent.set()
+            self.searchThread.join(0.01)
+        self.searchThread = None
+
+
+def main(stdin=sys.stdin, out=sys.stdout):
+    engine = UCIEngine(out)
+    for line in stdin:
+        if not engine.handle(line):
+            break
+    else: #input closed without quit
+        engine.handle("quit")
+
+
+if __name__ == "__main__":
+    main()
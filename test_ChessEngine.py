@@ -0,0 +1,153 @@
+"""
+Regression tests, run with python -m pytest
+"""
+
+import asyncio
+import io
+import time
+
+import pytest
+
+import ChessEngine
+import ChessPGN
+import ChessServer
+import ChessTransposition
+import ChessUCI
+
+
+def findMove(gs, text):
+    for move in gs.getValidMoves():
+        if move.getUCINotation() == text:
+            return move
+    return None
+
+
+def test_seeWhenTheRecaptureLosesMore():
+    #exd5 wins the queen, Bxd5 takes the pawn back
+    gs = ChessEngine.GameState("4k3/8/2b5/3q4/4P3/8/8/4K3 w - - 0 1")
+    move = findMove(gs, "e4d5")
+    assert gs.see(move) == 800
+    assert gs.seeGE(move, 800)
+    assert not gs.seeGE(move, 801)
+
+def test_seeOfACapturePromotion():
+    #axb8=Q wins the rook and a queen for the pawn, Rxb8 takes the queen back
+    gs = ChessEngine.GameState("1rr1k3/P7/8/8/8/8/8/4K3 w - - 0 1")
+    move = findMove(gs, "a7b8q")
+    assert gs.see(move) == 400
+    assert gs.seeGE(move, 400)
+    assert not gs.seeGE(move, 401)
+
+def test_castlingRightsWithoutKingOrRook():
+    gs = ChessEngine.GameState("4k3/8/8/8/8/8/8/4K3 w KQkq - 0 1")
+    assert gs.castlingRights == 0
+    assert findMove(gs, "e1g1") is None
+    assert findMove(gs, "e1c1") is None
+    gs = ChessEngine.GameState("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1")
+    assert gs.getFEN().split()[2] == "Kq"
+
+def test_sideNotToMoveInCheckIsRejected():
+    for fen in ("4k3/8/8/8/8/8/4R3/4K3 w - - 0 1", "Kk6/8/8/8/8/8/8/8 w - - 0 1"):
+        with pytest.raises(ValueError):
+            ChessEngine.GameState(fen)
+    ChessEngine.GameState("4k3/8/8/8/8/8/4R3/4K3 b - - 0 1") #black to move and in check is fine
+
+def test_enpassantSquareWithoutAPawnBehindIt():
+    gs = ChessEngine.GameState("4k3/8/8/3P4/8/8/8/4K3 w - e6 0 1")
+    assert gs.enpassantPossible == ()
+    assert findMove(gs, "d5e6") is None
+    gs = ChessEngine.GameState("4k3/8/8/3Pp3/8/8/8/4K3 w - e6 0 1")
+    assert findMove(gs, "d5e6").isEnpassantMove
+
+def test_transpositionTableReplacement():
+    tt = ChessTransposition.TranspositionTable(buffer=bytearray(4 * ChessTransposition.BUCKET_BYTES))
+    #keys 5, 9, 13 and 17 all fall into bucket 1 of 4
+    tt.store(5, 6, ChessTransposition.EXACT, -50, 123)
+    assert tt.probe(5) == (6, ChessTransposition.EXACT, -50, 123)
+    assert tt.probe(9) is None
+    tt.store(9, 2, ChessTransposition.LOWER, 10, 7) #shallower, so it goes into the always replace entry
+    assert tt.probe(5)[0] == 6
+    assert tt.probe(9) == (2, ChessTransposition.LOWER, 10, 7)
+    tt.store(13, 3, ChessTransposition.UPPER, 0, 8) #pushes out 9, the deep entry stays
+    assert tt.probe(9) is None
+    assert tt.probe(5)[0] == 6
+    assert tt.probe(13)[0] == 3
+    tt.newSearch()
+    tt.store(17, 1, ChessTransposition.EXACT, 0, 9) #the deep entry is from the last search, so it is replaced
+    assert tt.probe(5) is None
+    assert tt.probe(17)[0] == 1
+    assert tt.probe(13)[0] == 3
+
+def test_readGamesAndSanToMove(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text(
+        "\n\n"
+        "[Event \"one\"]\n"
+        "[Result \"1-0\"]\n\n"
+        "1. e4 e5 2. Nf3 {a comment} Nc6 3. Bb5 (3. Bc4 Bc5) a6 4. Ba4 Nf6 5. O-O $1 Be7 1-0\n\n"
+        "[Event \"two\"]\n"
+        "[FEN \"4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1\"]\n\n"
+        "1. O-O-O Kd7 *\n")
+    games = list(ChessPGN.readGames(str(path)))
+    assert [game.headers["Event"] for game in games] == ["one", "two"]
+    assert games[0].sanMoves == ["e4", "e5", "Nf3", "Nc6", "Bb5", "a6", "Ba4", "Nf6", "O-O", "Be7"]
+    gs = games[0].startPosition()
+    for san in games[0].sanMoves:
+        gs.makeMove(ChessPGN.sanToMove(gs, san))
+    assert gs.getFEN().split()[:3] == ["r1bqk2r/1pppbppp/p1n2n2/4p3/B3P3/5N2/PPPP1PPP/RNBQ1RK1", "w", "kq"]
+    gs = games[1].startPosition()
+    move = ChessPGN.sanToMove(gs, games[1].sanMoves[0])
+    assert move.getUCINotation() == "e1c1"
+    gs = ChessEngine.GameState("4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1")
+    with pytest.raises(ValueError): #both knights can go to d2
+        ChessPGN.sanToMove(gs, "Nd2")
+    assert ChessPGN.sanToMove(gs, "Nbd2").startCol == 1
+    with pytest.raises(ValueError):
+        ChessPGN.sanToMove(gs, "Nd3")
+
+def test_uciHandle():
+    out = io.StringIO()
+    engine = ChessUCI.UCIEngine(out)
+    for line in ("uci", "isready", "setoption name Hash value 1"):
+        engine.handle(line)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith("id name")
+    assert "uciok" in lines and lines[-1] == "readyok"
+    engine.handle("position startpos moves e2e4 e7e5")
+    engine.handle("go depth 2")
+    engine.searchThread.join()
+    lines = out.getvalue().splitlines()
+    assert lines[-1].startswith("bestmove ")
+    assert ChessUCI.uciToMove(engine.gs, lines[-1].split()[1]) is not None
+    engine.handle("go infinite")
+    time.sleep(0.2)
+    assert out.getvalue().count("bestmove") == 1 #held back until stop
+    engine.handle("stop")
+    assert out.getvalue().count("bestmove") == 2
+    assert engine.handle("quit") is False
+
+def test_serverDeduplicatesAndCaches():
+    async def run():
+        server = ChessServer.AnalysisServer(workers=1, hashMb=1)
+        await server.startWorkers()
+        try:
+            request = {"fen": ChessEngine.START_FEN, "depth": 2}
+            first = await server.submit(dict(request, id=1))
+            second = await server.submit(dict(request, id=2)) #same search while it is running
+            answers = await asyncio.gather(first, second)
+            repeat = await (await server.submit(dict(request, id=3)))
+            bad = await (await server.submit({"id": 4, "fen": "not a fen"}))
+        finally:
+            await server.close()
+        return server, answers, repeat, bad
+    server, answers, repeat, bad = asyncio.run(run())
+    assert [answer["id"] for answer in answers] == [1, 2]
+    assert answers[0]["bestmove"] == answers[1]["bestmove"]
+    assert not answers[0]["cached"] and not answers[1]["cached"]
+    assert repeat["cached"] and repeat["bestmove"] == answers[0]["bestmove"] and repeat["id"] == 3
+    assert "error" in bad and bad["id"] == 4
+    stats = server.statistics()
+    assert stats["searches"] == 1
+    assert stats["deduplicated"] == 1
+    assert stats["cacheHits"] == 1
+    assert stats["errors"] == 1